@@ -0,0 +1,51 @@
+"""Benchmark cold start (compiling templates in a fresh processor) with and without a bytecode cache
+
+Usage: python benchmarks/cold_start.py
+"""
+
+import tempfile
+import time
+from typing import Optional
+
+from miniset import JinjaTemplateProcessor
+
+TEMPLATE_COUNT = 200
+
+
+def build_templates() -> list[str]:
+    templates: list[str] = []
+    for i in range(TEMPLATE_COUNT):
+        conditions = " AND ".join(f"c{j} = {{{{ request.c{j} }}}}" for j in range(20))
+        templates.append(
+            f"SELECT /* {i} */ * FROM t WHERE {conditions}"
+            " {% if ids %}AND id IN {{ ids | where_in }}{% endif %}"
+            " {% for column in columns %}, {{ column | identifier }}{% endfor %}"
+        )
+    return templates
+
+
+def measure(templates: list[str], bytecode_cache_dir: Optional[str]) -> float:
+    p = JinjaTemplateProcessor(bytecode_cache_dir=bytecode_cache_dir)
+    start = time.perf_counter()
+    p.warmup(templates)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    templates = build_templates()
+
+    without_cache = min(measure(templates, None) for _ in range(3))
+
+    with tempfile.TemporaryDirectory() as directory:
+        # populate the bytecode cache
+        measure(templates, directory)
+        with_cache = min(measure(templates, directory) for _ in range(3))
+
+    print(f"templates: {TEMPLATE_COUNT}")  # noqa: T201
+    print(f"without bytecode cache: {without_cache * 1000:.1f} ms")  # noqa: T201
+    print(f"with bytecode cache: {with_cache * 1000:.1f} ms")  # noqa: T201
+    print(f"speedup: {without_cache / with_cache:.1f}x")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
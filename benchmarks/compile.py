@@ -0,0 +1,123 @@
+"""Benchmark compile time of large templates with the token stream rewrite (former and current) and the AST rewrite
+
+Usage: python benchmarks/compile.py
+"""
+
+import time
+from collections.abc import Generator
+
+from jinja2 import DebugUndefined, Environment
+from jinja2.ext import Extension
+from jinja2.lexer import Token, TokenStream
+from jinja2.sandbox import SandboxedEnvironment
+
+from miniset import JinjaTemplateProcessor
+
+
+class LegacySqlExtension(Extension):
+    """The former implementation of SqlExtension.filter_stream"""
+
+    def extract_param_name(self, tokens: list[Token]) -> str:
+        name: str = ""
+        for token in tokens:
+            if token.test("variable_begin"):
+                continue
+
+            if token.test("name") or token.test("dot"):
+                name += token.value
+
+            break
+
+        if not name:
+            name = "bind#0"
+
+        return name
+
+    def filter_stream(self, stream: TokenStream) -> Generator[Token, None, None]:
+        while not stream.eos:
+            token = next(stream)
+            if token.test("variable_begin"):
+                var_expr: list[Token] = []
+
+                while not token.test("variable_end"):
+                    var_expr.append(token)
+                    token = next(stream)
+
+                variable_end = token
+
+                last_token = var_expr[-1]
+                lineno = last_token.lineno
+                if not last_token.test("name") or last_token.value not in (
+                    "bind",
+                    "where_in",
+                    "sql_safe",
+                ):
+                    param_name = self.extract_param_name(var_expr)
+
+                    var_expr.insert(1, Token(lineno, "lparen", "("))
+                    var_expr.append(Token(lineno, "rparen", ")"))
+                    var_expr.append(Token(lineno, "pipe", "|"))
+                    var_expr.append(Token(lineno, "name", "bind"))
+                    var_expr.append(Token(lineno, "lparen", "("))
+                    var_expr.append(Token(lineno, "string", param_name))
+                    var_expr.append(Token(lineno, "rparen", ")"))
+
+                var_expr.append(variable_end)
+
+                yield from var_expr
+            else:
+                yield token
+
+
+def build_template(expressions: int) -> str:
+    lines = [
+        f"SELECT {{{{ row{i}.value | upper }}}} AS c{i}, {{{{ '%' ~ row{i}.name ~ '%' }}}}, {{{{ row{i}.columns | sql_safe }}}} FROM t{i} UNION ALL"
+        for i in range(expressions // 3)
+    ]
+    return "\n".join(lines) + "\nSELECT 1"
+
+
+def measure(env: Environment, source: str, *, lex_only: bool) -> float:
+    results: list[float] = []
+    for _ in range(3):
+        start = time.perf_counter()
+        if lex_only:
+            # lexing + token stream rewrite
+            for _ in env._tokenize(source, None):
+                pass
+        else:
+            env.compile(source)
+        results.append(time.perf_counter() - start)
+
+    return min(results)
+
+
+def main() -> None:
+    legacy = SandboxedEnvironment(
+        undefined=DebugUndefined, extensions=[LegacySqlExtension]
+    )
+    legacy.filters.update(JinjaTemplateProcessor()._env.filters)
+    stream = JinjaTemplateProcessor()._env
+    ast = JinjaTemplateProcessor(rewrite_mode="ast")._env
+
+    print(  # noqa: T201
+        f"{'expressions':>12} {'size (KB)':>10} {'rewrite: legacy':>16} {'stream':>8} {'ast':>8}"
+        f" {'compile: legacy':>16} {'stream':>8} {'ast':>8}  (ms)"
+    )
+    for expressions in (300, 3_000, 15_000):
+        source = build_template(expressions)
+        rewrites = [
+            measure(env, source, lex_only=True) for env in (legacy, stream, ast)
+        ]
+        compiles = [
+            measure(env, source, lex_only=False) for env in (legacy, stream, ast)
+        ]
+        print(  # noqa: T201
+            f"{expressions:>12} {len(source) / 1024:>10.0f} "
+            + f"{rewrites[0] * 1000:>16.1f} {rewrites[1] * 1000:>8.1f} {rewrites[2] * 1000:>8.1f} "
+            + f"{compiles[0] * 1000:>16.1f} {compiles[1] * 1000:>8.1f} {compiles[2] * 1000:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
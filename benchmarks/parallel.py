@@ -0,0 +1,65 @@
+"""Benchmark rendering many contexts sequentially vs. in worker processes
+
+Usage: python benchmarks/parallel.py [--renders 100000]
+"""
+
+import argparse
+import os
+import time
+from typing import Any
+
+from miniset import JinjaTemplateProcessor
+from miniset.parallel import render_parallel
+
+TEMPLATE = """
+INSERT INTO {{ table | identifier }} (id, name, tags)
+SELECT v.id, v.name, v.tags FROM (VALUES
+{% for row in rows %}
+({{ row.id }}, {{ row.name }}, {{ row.tags }}){% if not loop.last %},{% endif %}
+{% endfor %}
+) AS v (id, name, tags)
+WHERE v.id NOT IN {{ excluded | where_in }}
+"""
+
+
+def build_contexts(n: int) -> list[dict[str, Any]]:
+    return [
+        {
+            "table": f"table_{i % 10}",
+            "rows": [
+                {"id": i * 10 + j, "name": f"name-{j}", "tags": "a,b"}
+                for j in range(10)
+            ],
+            "excluded": list(range(i % 20)),
+        }
+        for i in range(n)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--renders", type=int, default=100_000)
+    args = parser.parse_args()
+
+    contexts = build_contexts(args.renders)
+
+    p = JinjaTemplateProcessor()
+    start = time.perf_counter()
+    for context in contexts:
+        p.prepare_query(TEMPLATE, **context)
+    sequential = time.perf_counter() - start
+    print(f"{'sequential':<12} {sequential:>8.2f}s")  # noqa: T201
+
+    cpus = os.cpu_count() or 1
+    for workers in sorted({1, 2, 4, cpus}):
+        start = time.perf_counter()
+        for _ in render_parallel(TEMPLATE, contexts, workers=workers):
+            pass
+        elapsed = time.perf_counter() - start
+        print(  # noqa: T201
+            f"{f'workers={workers}':<12} {elapsed:>8.2f}s {sequential / elapsed:>6.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
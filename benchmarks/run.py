@@ -0,0 +1,196 @@
+"""Rendering benchmark suite
+
+Measures compile time, render time (cold and warm) and allocations of representative templates
+across all the param styles, and writes the results as JSON so that they can be compared across commits.
+
+Usage:
+    python benchmarks/run.py --output before.json
+    python benchmarks/run.py --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from collections.abc import Callable
+from typing import Any, Optional, get_args
+
+import jinja2
+
+from miniset import JinjaTemplateProcessor, ParamStyleType
+
+SCENARIOS: dict[str, tuple[str, dict[str, Any]]] = {
+    "simple_lookups": (
+        "SELECT * FROM projects WHERE id = {{ project.id }} AND owner = {{ user.name }} AND status = {{ status }}",
+        {"project": {"id": 1}, "user": {"name": "foo"}, "status": "active"},
+    ),
+    "where_in_1k": (
+        "SELECT * FROM projects WHERE id IN {{ ids | where_in }}",
+        {"ids": list(range(1_000))},
+    ),
+    "nested_loops_identifier": (
+        "SELECT {% for table in tables %}{% for column in table.columns %}{{ [table.name, column] | identifier }}{% if not loop.last %}, {% endif %}{% endfor %}{% if not loop.last %}, {% endif %}{% endfor %}"
+        " FROM {% for table in tables %}{{ table.name | identifier }}{% if not loop.last %}, {% endif %}{% endfor %}"
+        " WHERE {% for table in tables %}{{ [table.name, 'id'] | identifier }} = {{ table.id }}{% if not loop.last %} AND {% endif %}{% endfor %}",
+        {
+            "tables": [
+                {"name": f"t{i}", "id": i, "columns": [f"c{j}" for j in range(10)]}
+                for i in range(10)
+            ]
+        },
+    ),
+    "sql_safe_heavy": (
+        "SELECT {{ columns | sql_safe }} FROM {{ table | sql_safe }}"
+        "{% for condition in conditions %} {{ ('WHERE' if loop.first else 'AND') | sql_safe }} {{ condition.column | sql_safe }} {{ condition.op | sql_safe }} {{ condition.value }}{% endfor %}"
+        " ORDER BY {{ order | sql_safe }}",
+        {
+            "columns": "id, name, status",
+            "table": "projects",
+            "conditions": [
+                {"column": f"c{i}", "op": "=", "value": i} for i in range(50)
+            ],
+            "order": "id DESC",
+        },
+    ),
+}
+
+
+def timeit(func: Callable[[], Any], *, number: int, repeat: int) -> float:
+    """Return the best mean time (seconds) of a function call"""
+    results: list[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        results.append((time.perf_counter() - start) / number)
+
+    return min(results)
+
+
+def measure_allocations(func: Callable[[], Any]) -> dict[str, int]:
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        func()
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    stats = after.compare_to(before, "filename")
+    return {
+        "peak_bytes": peak,
+        "allocated_blocks": sum(max(stat.count_diff, 0) for stat in stats),
+    }
+
+
+def run_scenario(
+    param_style: ParamStyleType, template: str, context: dict[str, Any], *, quick: bool
+) -> dict[str, Any]:
+    number = 20 if quick else 200
+    repeat = 3 if quick else 5
+
+    # processors are built outside the timed functions not to measure environment construction
+    cold_processor = JinjaTemplateProcessor(param_style=param_style)
+
+    def cold() -> Any:
+        cold_processor.clear_cache()
+        return cold_processor.prepare_query(template, **context)
+
+    def compile_only() -> Any:
+        cold_processor.clear_cache()
+        return cold_processor._get_template(template)
+
+    warm_processor = JinjaTemplateProcessor(param_style=param_style)
+    warm_processor.warmup([template])
+
+    def warm() -> Any:
+        return warm_processor.prepare_query(template, **context)
+
+    cached_processor = JinjaTemplateProcessor(
+        param_style=param_style, result_cache_size=1
+    )
+
+    def cached() -> Any:
+        return cached_processor.prepare_query(template, **context)
+
+    cold_number = max(1, number // 10)
+    return {
+        "compile_s": timeit(compile_only, number=cold_number, repeat=repeat),
+        "cold_render_s": timeit(cold, number=cold_number, repeat=repeat),
+        "warm_render_s": timeit(warm, number=number, repeat=repeat),
+        "cached_render_s": timeit(cached, number=number, repeat=repeat),
+        **measure_allocations(warm),
+    }
+
+
+def run(*, quick: bool = False) -> dict[str, Any]:
+    results: dict[str, Any] = {}
+    for name, (template, context) in SCENARIOS.items():
+        for param_style in get_args(ParamStyleType):
+            results[f"{name}[{param_style}]"] = run_scenario(
+                param_style, template, context, quick=quick
+            )
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "jinja2": jinja2.__version__,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def print_results(report: dict[str, Any], baseline: Optional[dict[str, Any]]) -> None:
+    header = f"{'benchmark':<36} {'compile (us)':>13} {'cold (us)':>11} {'warm (us)':>11} {'cached (us)':>12} {'peak (KB)':>10}"
+    if baseline is not None:
+        header += f" {'warm vs base':>13}"
+    print(header)  # noqa: T201
+
+    for name, result in report["results"].items():
+        line = (
+            f"{name:<36} {result['compile_s'] * 1e6:>13.1f} {result['cold_render_s'] * 1e6:>11.1f}"
+            f" {result['warm_render_s'] * 1e6:>11.1f} {result.get('cached_render_s', 0.0) * 1e6:>12.1f}"
+            f" {result['peak_bytes'] / 1024:>10.1f}"
+        )
+        if baseline is not None:
+            base = baseline["results"].get(name)
+            if base is not None:
+                ratio = result["warm_render_s"] / base["warm_render_s"]
+                line += f" {ratio:>12.2f}x"
+
+        print(line)  # noqa: T201
+
+    warm = [r["warm_render_s"] for r in report["results"].values()]
+    cold = [r["cold_render_s"] for r in report["results"].values()]
+    print(  # noqa: T201
+        f"\ncold/warm (geometric mean): {statistics.geometric_mean([c / w for c, w in zip(cold, warm)]):.1f}x"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--output", help="Path to write results as JSON")
+    parser.add_argument("--compare", help="Path to baseline results (JSON)")
+    parser.add_argument("--quick", action="store_true", help="Run fewer iterations")
+    args = parser.parse_args()
+
+    report = run(quick=args.quick)
+
+    baseline: Optional[dict[str, Any]] = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    print_results(report, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark context validation against the former top-level type name check
+
+Usage: python benchmarks/validation.py
+"""
+
+import timeit
+from datetime import date
+from typing import Any
+
+from miniset import JinjaTemplateProcessor
+from miniset.validation import ContextValidator
+
+LEGACY_ALLOWED_TYPES = (
+    "NoneType",
+    "bool",
+    "str",
+    "unicode",
+    "int",
+    "long",
+    "float",
+    "list",
+    "dict",
+    "tuple",
+    "set",
+)
+
+
+def legacy_validate_context_types(context: dict[str, Any]) -> dict[str, Any]:
+    for key in context:
+        arg_type = type(context[key]).__name__
+        if arg_type not in LEGACY_ALLOWED_TYPES:
+            raise ValueError(f"Unsafe template value for key {key}: {arg_type}")
+
+    return context
+
+
+CONTEXTS: dict[str, dict[str, Any]] = {
+    "flat (10 keys)": {f"key{i}": i for i in range(10)},
+    "where_in (100k ids)": {"ids": list(range(100_000)), "name": "foo"},
+    "nested (1k dicts)": {
+        "rows": [
+            {"id": i, "name": f"name-{i}", "tags": ["a", "b"], "day": date.today()}
+            for i in range(1_000)
+        ]
+    },
+}
+
+
+def measure(func: Any, number: int = 100) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main() -> None:
+    validator = ContextValidator()
+    top_level_validator = ContextValidator(recursive=False)
+
+    print(  # noqa: T201
+        f"{'context':<22} {'legacy (us)':>12} {'recursive (us)':>15} {'top-level (us)':>15}"
+    )
+    for name, context in CONTEXTS.items():
+        legacy = measure(lambda context=context: legacy_validate_context_types(context))
+        recursive = measure(lambda context=context: validator.validate(context))
+        top_level = measure(
+            lambda context=context: top_level_validator.validate(context)
+        )
+        print(  # noqa: T201
+            f"{name:<22} {legacy:>12.2f} {recursive:>15.2f} {top_level:>15.2f}"
+        )
+
+    # end-to-end latency of prepare_query
+    print()  # noqa: T201
+    template = "SELECT * FROM t WHERE id IN {{ ids | where_in }} AND name = {{ name }}"
+    context = CONTEXTS["where_in (100k ids)"]
+    for label, v in (("recursive", validator), ("top-level", top_level_validator)):
+        p = JinjaTemplateProcessor(param_style="qmark", validator=v)
+        elapsed = measure(lambda p=p: p.prepare_query(template, **context), number=20)
+        print(f"prepare_query with where_in (100k ids), {label}: {elapsed:.2f} us")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
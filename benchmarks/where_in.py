@@ -0,0 +1,38 @@
+"""Benchmark where_in filter throughput per param style
+
+Usage: python benchmarks/where_in.py
+"""
+
+import timeit
+from functools import partial
+from typing import get_args
+
+from miniset import JinjaTemplateProcessor, ParamStyleType
+
+TEMPLATE = "SELECT * FROM t WHERE id IN {{ ids | where_in }}"
+SIZES = (1_000, 10_000, 100_000)
+
+
+def main() -> None:
+    print(f"{'param_style':<10} {'size':>8} {'ms/render':>10} {'values/s':>14}")  # noqa: T201
+
+    for param_style in get_args(ParamStyleType):
+        p = JinjaTemplateProcessor(param_style=param_style)
+        for size in SIZES:
+            ids = list(range(size))
+            number = max(1, 100_000 // size)
+            elapsed = min(
+                timeit.repeat(
+                    partial(p.prepare_query, TEMPLATE, ids=ids),
+                    number=number,
+                    repeat=5,
+                )
+            )
+            per_render = elapsed / number
+            print(  # noqa: T201
+                f"{param_style:<10} {size:>8} {per_render * 1000:>10.3f} {size / per_render:>14,.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,42 @@
-import importlib.metadata
+from typing import TYPE_CHECKING, Any
 
-from .jinja_context import JinjaTemplateProcessor  # noqa: F401
-from .types import ParamStyleType  # noqa: F401
+from .types import ParamStyleType
 
-__version__ = importlib.metadata.version("mini-set")
+if TYPE_CHECKING:  # pragma: no cover
+    from .jinja_context import JinjaTemplateProcessor
+
+    __version__: str
+
+__all__ = ["JinjaTemplateProcessor", "ParamStyleType", "__version__"]
+
+
+def __getattr__(name: str) -> Any:
+    # defer expensive imports (Jinja2 and importlib.metadata) until they are used
+    if name == "JinjaTemplateProcessor":
+        from .jinja_context import JinjaTemplateProcessor
+
+        value: Any = JinjaTemplateProcessor
+    elif name == "__version__":
+        import importlib.metadata
+
+        value = importlib.metadata.version("mini-set")
+    else:
+        # submodules (e.g. miniset.jinja_context) as they were imported eagerly before
+        import importlib
+
+        try:
+            value = importlib.import_module(f".{name}", __name__)
+        except ModuleNotFoundError as e:
+            if e.name != f"{__name__}.{name}":
+                raise
+
+            raise AttributeError(
+                f"module {__name__!r} has no attribute {name!r}"
+            ) from None
+
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted({*globals(), *__all__})
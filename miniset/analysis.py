@@ -0,0 +1,97 @@
+from collections.abc import Iterable
+from typing import NamedTuple, Optional
+
+from jinja2 import meta, nodes
+
+from .extensions import extract_node_param_name
+from .plan import find_static_segments
+
+# filters returning SQL safe values
+SAFE_FILTERS = frozenset(("sql_safe", "identifier"))
+
+
+class FilterSite(NamedTuple):
+    """A filter call in a template"""
+
+    name: str
+    lineno: int
+
+
+class TemplateAnalysis(NamedTuple):
+    """Static analysis of a (SqlExtension rewritten) template
+
+    Attributes:
+        variables (frozenset[str]): Variables the template reads from the context (included or imported templates are not analyzed)
+        bind_sites (tuple[FilterSite, ...]): Bind params. The name is the param name.
+        where_in_sites (tuple[FilterSite, ...]): where_in filters. The name is the leftmost variable of the values.
+        sql_safe_sites (tuple[FilterSite, ...]): sql_safe filters. The name is the leftmost variable of the value.
+        identifier_sites (tuple[FilterSite, ...]): identifier filters. The name is the leftmost variable of the value.
+        is_static (bool): Whether the SQL shape is static or not (see `JinjaTemplateProcessor.compile`)
+        dynamic_reason (Optional[str]): A reason why the SQL shape is dynamic
+    """
+
+    variables: frozenset[str]
+    bind_sites: tuple[FilterSite, ...]
+    where_in_sites: tuple[FilterSite, ...]
+    sql_safe_sites: tuple[FilterSite, ...]
+    identifier_sites: tuple[FilterSite, ...]
+    is_static: bool
+    dynamic_reason: Optional[str]
+
+    def missing(self, names: Iterable[str]) -> frozenset[str]:
+        """Get variables not in the given names (e.g. context keys)
+
+        Variables used only in a branch (e.g. `{% if %}`) may not be required.
+
+        Args:
+            names (Iterable[str]): Names
+
+        Returns:
+            frozenset[str]: Missing variables
+        """
+        return self.variables.difference(names)
+
+
+def analyze_template(
+    node: nodes.Template, *, ignore: Iterable[str] = ()
+) -> TemplateAnalysis:
+    """Analyze a (SqlExtension rewritten) template
+
+    Args:
+        node (nodes.Template): Template node
+        ignore (Iterable[str], optional): Names not to report as variables (e.g. environment globals). Defaults to ().
+
+    Returns:
+        TemplateAnalysis: Analysis
+    """
+    sites: dict[str, list[FilterSite]] = {
+        "bind": [],
+        "where_in": [],
+        "sql_safe": [],
+        "identifier": [],
+    }
+    for item in node.find_all(nodes.Filter):
+        if item.name not in sites or item.node is None:
+            continue
+
+        name = extract_node_param_name(item.node)
+        if item.name == "bind":
+            if isinstance(item.node, nodes.Filter) and item.node.name in SAFE_FILTERS:
+                # SQL safe values are not bound
+                continue
+
+            if item.args and isinstance(item.args[0], nodes.Const):
+                name = item.args[0].value
+
+        sites[item.name].append(FilterSite(name=name, lineno=item.lineno))
+
+    segments, reason = find_static_segments(node)
+    return TemplateAnalysis(
+        variables=frozenset(meta.find_undeclared_variables(node)).difference(ignore),
+        bind_sites=tuple(sites["bind"]),
+        where_in_sites=tuple(sites["where_in"]),
+        sql_safe_sites=tuple(sites["sql_safe"]),
+        identifier_sites=tuple(sites["identifier"]),
+        is_static=segments is not None,
+        dynamic_reason=reason,
+    )
@@ -0,0 +1,70 @@
+import os
+from hashlib import sha1
+from typing import Any, Optional, Union
+
+from jinja2 import Environment
+from jinja2.bccache import FileSystemBytecodeCache
+
+
+def build_cache_key_prefix(env: Environment, **settings: Any) -> str:
+    """Build a cache key prefix from miniset version, SqlExtension behaviour, Jinja2 environment settings and processor settings
+
+    Args:
+        env (Environment): Jinja2 environment
+
+    Returns:
+        str: Cache key prefix
+    """
+    # avoid a circular import
+    from . import __version__
+    from .extensions import SqlExtension
+
+    parts = [
+        __version__,
+        str(SqlExtension.cache_version),
+        env.block_start_string,
+        env.block_end_string,
+        env.variable_start_string,
+        env.variable_end_string,
+        env.comment_start_string,
+        env.comment_end_string,
+        str(env.line_statement_prefix),
+        str(env.line_comment_prefix),
+        str(env.trim_blocks),
+        str(env.lstrip_blocks),
+        env.newline_sequence,
+        str(env.keep_trailing_newline),
+        str(env.autoescape),
+        str(env.optimized),
+        str(env.is_async),
+        ",".join(sorted(env.extensions)),
+        *(f"{k}={v}" for k, v in sorted(settings.items())),
+    ]
+    return sha1("\x00".join(parts).encode()).hexdigest()
+
+
+class SqlBytecodeCache(FileSystemBytecodeCache):
+    """File system bytecode cache whose keys incorporate a prefix so that stale entries are never reused"""
+
+    def __init__(
+        self,
+        directory: Optional[Union[str, os.PathLike]] = None,
+        pattern: str = "__miniset_%s.cache",
+        *,
+        key_prefix: str = "",
+    ) -> None:
+        """Initialize the bytecode cache.
+
+        Args:
+            directory (Optional[Union[str, os.PathLike]], optional): Cache directory. Defaults to None (a temporary directory).
+            pattern (str, optional): Cache file name pattern. Defaults to "__miniset_%s.cache".
+            key_prefix (str, optional): Cache key prefix. Defaults to "".
+        """
+        super().__init__(
+            directory=os.fspath(directory) if directory is not None else None,
+            pattern=pattern,
+        )
+        self.key_prefix = key_prefix
+
+    def get_cache_key(self, name: str, filename: Optional[str] = None) -> str:
+        return super().get_cache_key(f"{self.key_prefix}|{name}", filename)
@@ -0,0 +1,195 @@
+from collections import OrderedDict
+from collections.abc import Hashable
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from threading import Lock
+from time import monotonic
+from typing import Any, Generic, NamedTuple, Optional, TypeVar
+from uuid import UUID
+
+V = TypeVar("V")
+
+# immutable scalar types whose values can be used as keys as they are
+SCALAR_KEY_TYPES = frozenset(
+    (
+        type(None),
+        bool,
+        int,
+        float,
+        str,
+        bytes,
+        datetime,
+        date,
+        time,
+        timedelta,
+        Decimal,
+        UUID,
+    )
+)
+
+
+def freeze(value: Any) -> Hashable:
+    """Convert a value into a hashable key distinguishing types (e.g. `1`, `1.0` and `True`)
+
+    Args:
+        value (Any): Value
+
+    Raises:
+        TypeError: If the value is or contains an unhashable value
+
+    Returns:
+        Hashable: Key
+    """
+    cls = type(value)
+    if cls is dict:
+        return (cls, tuple([(k, freeze(v)) for k, v in value.items()]))
+
+    if cls in (list, tuple, set, frozenset):
+        # keep the iteration order, which may change the rendered query
+        types = tuple(map(type, value))
+        if SCALAR_KEY_TYPES.issuperset(types):
+            # fast path: a container of scalars only (e.g. a list for where_in)
+            return (cls, types, tuple(value))
+
+        return (cls, tuple([freeze(v) for v in value]))
+
+    hash(value)
+    return (cls, value)
+
+
+class CacheInfo(NamedTuple):
+    """Cache statistics (expired entries are counted as evictions)"""
+
+    hits: int
+    misses: int
+    evictions: int
+    max_size: int
+    size: int
+
+
+class LRUCache(Generic[V]):
+    """Size-bounded, thread-safe cache with least-recently-used eviction and optional expiration"""
+
+    def __init__(self, max_size: int = 128, ttl: Optional[float] = None) -> None:
+        """Initialize the cache.
+
+        Args:
+            max_size (int, optional): Max number of entries. 0 disables the cache. Defaults to 128.
+            ttl (Optional[float], optional): Seconds to keep an entry. Defaults to None (no expiration).
+        """
+        if max_size < 0:
+            raise ValueError("max_size must be greater than or equal to 0")
+
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be greater than 0")
+
+        self._max_size = max_size
+        self._ttl = ttl
+        self._data: OrderedDict[Hashable, V] = OrderedDict()
+        # expiration times of the entries if ttl is set
+        self._expires: dict[Hashable, float] = {}
+        self._lock = Lock()
+
+        self._hits: int = 0
+        self._misses: int = 0
+        self._evictions: int = 0
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """Get a value and mark it as recently used
+
+        Args:
+            key (Hashable): Key
+
+        Returns:
+            Optional[V]: Value if it exists
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self._misses += 1
+                return None
+
+            if self._ttl is not None and self._expires[key] <= monotonic():
+                del self._data[key]
+                del self._expires[key]
+                self._evictions += 1
+                self._misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key: Hashable, value: V) -> None:
+        """Set a value and evict the least recently used entries if the cache is full
+
+        Args:
+            key (Hashable): Key
+            value (V): Value
+        """
+        if self._max_size == 0:
+            return
+
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if self._ttl is not None:
+                self._expires[key] = monotonic() + self._ttl
+
+            while len(self._data) > self._max_size:
+                evicted, _ = self._data.popitem(last=False)
+                self._expires.pop(evicted, None)
+                self._evictions += 1
+
+    def pop(self, key: Hashable) -> Optional[V]:
+        """Remove a value and return it (counted as a hit or a miss)
+
+        Args:
+            key (Hashable): Key
+
+        Returns:
+            Optional[V]: Value if it exists
+        """
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self._misses += 1
+                return None
+
+            if self._ttl is not None and self._expires.pop(key) <= monotonic():
+                self._evictions += 1
+                self._misses += 1
+                return None
+
+            self._hits += 1
+            return value
+
+    def clear(self) -> None:
+        """Remove all the entries and reset the statistics"""
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+            self._hits = self._misses = self._evictions = 0
+
+    def info(self) -> CacheInfo:
+        """Get the cache statistics
+
+        Returns:
+            CacheInfo: Cache statistics
+        """
+        with self._lock:
+            return CacheInfo(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                max_size=self._max_size,
+                size=len(self._data),
+            )
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._data
@@ -48,3 +48,9 @@ class MinisetTemplateException(MinisetException):
     """Miniset template exception"""
 
     pass
+
+
+class MinisetUndefinedException(MinisetTemplateException):
+    """Miniset exception raised when a template uses an undefined variable in strict mode"""
+
+    pass
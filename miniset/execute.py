@@ -0,0 +1,269 @@
+import importlib
+from collections.abc import Iterable, Iterator, Mapping
+from typing import Any, Optional, Union, cast
+from weakref import WeakValueDictionary
+
+from jinja2 import Template
+
+from . import types
+from .cache import CacheInfo, LRUCache
+from .jinja_context import JinjaTemplateProcessor
+
+_PROCESSORS: dict[str, JinjaTemplateProcessor] = {}
+# runners by id of their connections. runners hold their connections (and cursors hold them too),
+# so runners are kept only while they are referenced elsewhere not to keep connections alive.
+_RUNNERS: "WeakValueDictionary[int, StatementRunner]" = WeakValueDictionary()
+
+
+def get_param_style(conn: Any) -> types.ParamStyleType:
+    """Get the param style of a DB-API 2 connection from its driver module
+
+    Args:
+        conn (Any): DB-API 2 connection
+
+    Returns:
+        types.ParamStyleType: Param style. Defaults to "format" if the driver does not tell it.
+    """
+    # look up base classes too for subclassed connections (e.g. `sqlite3.connect(factory=...)`)
+    for cls in type(conn).__mro__:
+        package = cls.__module__.split(".")[0]
+        try:
+            param_style = importlib.import_module(package).paramstyle
+        except (ImportError, AttributeError):
+            continue
+
+        return cast(types.ParamStyleType, param_style)
+
+    return "format"
+
+
+def get_processor(conn: Any) -> JinjaTemplateProcessor:
+    """Get a (shared) processor for the param style of a DB-API 2 connection
+
+    Args:
+        conn (Any): DB-API 2 connection
+
+    Returns:
+        JinjaTemplateProcessor: Processor
+    """
+    param_style = get_param_style(conn)
+    processor = _PROCESSORS.get(param_style)
+    if processor is None:
+        processor = _PROCESSORS.setdefault(
+            param_style, JinjaTemplateProcessor(param_style=param_style)
+        )
+
+    return processor
+
+
+class StatementRunner:
+    """Run query templates on a DB-API 2 connection.
+
+    Cursors are cached per rendered query and reused, so that drivers can skip parsing/preparing the same statement again.
+    """
+
+    def __init__(
+        self,
+        conn: Any,
+        processor: Optional[JinjaTemplateProcessor] = None,
+        *,
+        cache_size: int = 64,
+        arraysize: int = 1000,
+    ) -> None:
+        """Initialize the runner.
+
+        Args:
+            conn (Any): DB-API 2 connection
+            processor (Optional[JinjaTemplateProcessor], optional): Processor. Defaults to None (a processor for the param style of the connection's driver).
+            cache_size (int, optional): Max number of cached statements (cursors). Defaults to 64.
+            arraysize (int, optional): Number of rows to fetch at a time. Defaults to 1000.
+        """
+        self.conn = conn
+        self.processor = processor or get_processor(conn)
+        self.arraysize = arraysize
+
+        self._statements: LRUCache[Any] = LRUCache(cache_size)
+
+    def _acquire(self, query: str) -> Any:
+        # take a cursor out of the cache not to share it while it is in use
+        cursor = self._statements.pop(query)
+        if cursor is None:
+            cursor = self.conn.cursor()
+            cursor.arraysize = self.arraysize
+
+        return cursor
+
+    def _release(self, query: str, cursor: Any) -> None:
+        self._statements.set(query, cursor)
+
+    def execute(self, query: Union[str, Template], **kwargs: Any) -> Any:
+        """Execute a query template
+
+        The returned cursor is cached and reused by the next execution of the same statement,
+        which resets its result set. Fetch results before that or use `fetch_iter` instead.
+
+        Args:
+            query (Union[str, Template]): A query string/template or a template name
+
+        Returns:
+            Any: Cursor
+        """
+        prepared, bind_params = self.processor.prepare_query(query, **kwargs)
+        cursor = self._acquire(prepared)
+        try:
+            cursor.execute(prepared, bind_params)
+        finally:
+            self._release(prepared, cursor)
+
+        return cursor
+
+    def executemany(
+        self,
+        query: Union[str, Template],
+        rows: Iterable[Mapping[str, Any]],
+        *,
+        batch_size: int = 1000,
+    ) -> int:
+        """Execute a query template for each row with `executemany`
+
+        Args:
+            query (Union[str, Template]): A query string/template or a template name
+            rows (Iterable[Mapping[str, Any]]): Rows (contexts)
+            batch_size (int, optional): Number of rows to execute at a time. Defaults to 1000.
+
+        Returns:
+            int: Total number of affected rows
+        """
+        total = 0
+        for prepared, bind_params_list in self.processor.prepare_many(
+            query, rows, batch_size=batch_size
+        ):
+            cursor = self._acquire(prepared)
+            try:
+                cursor.executemany(prepared, bind_params_list)
+                total += max(cursor.rowcount, 0)
+            finally:
+                self._release(prepared, cursor)
+
+        return total
+
+    def fetch_iter(
+        self,
+        query: Union[str, Template],
+        *,
+        split_where_in: bool = False,
+        **kwargs: Any,
+    ) -> Iterator[Any]:
+        """Execute a query template and stream rows with `fetchmany`
+
+        Args:
+            query (Union[str, Template]): A query string/template or a template name
+            split_where_in (bool, optional): Whether to split the query into multiple queries by its largest `where_in` list
+                if it exceeds `max_params` of the processor, and concatenate their rows.
+                Only correct for a plain `col IN (...)` filter (not for `NOT IN`, aggregates, `ORDER BY`/`LIMIT` or `DISTINCT`).
+                Defaults to False (raise MinisetTemplateException if the query exceeds `max_params`).
+
+        Yields:
+            Any: Row
+        """
+        queries = (
+            self.processor.prepare_query_chunks(query, **kwargs)
+            if split_where_in
+            else [self.processor.prepare_query(query, **kwargs)]
+        )
+        for prepared, bind_params in queries:
+            cursor = self._acquire(prepared)
+            try:
+                cursor.execute(prepared, bind_params)
+                while rows := cursor.fetchmany(self.arraysize):
+                    yield from rows
+            finally:
+                self._release(prepared, cursor)
+
+    def cache_info(self) -> CacheInfo:
+        """Get the statement cache statistics
+
+        Returns:
+            CacheInfo: Cache statistics
+        """
+        return self._statements.info()
+
+
+def get_runner(conn: Any) -> StatementRunner:
+    """Get the runner of a DB-API 2 connection used by the module-level helpers.
+
+    The runner is kept only while it is referenced. Keep a reference to it as long as the connection is used
+    (e.g. next to the connection in a pool) so that the module-level helpers reuse its statements.
+    Otherwise each call runs on a new runner.
+
+    Args:
+        conn (Any): DB-API 2 connection
+
+    Returns:
+        StatementRunner: Runner
+    """
+    # a live runner holds its connection, so the id of the connection is not reused
+    runner = _RUNNERS.get(id(conn))
+    if runner is None:
+        runner = StatementRunner(conn)
+        _RUNNERS[id(conn)] = runner
+
+    return runner
+
+
+def execute(conn: Any, query: Union[str, Template], /, **kwargs: Any) -> Any:
+    """Execute a query template on a DB-API 2 connection
+
+    The returned cursor is reused by the next execution of the same statement on the runner of the connection (see `get_runner`).
+
+    Args:
+        conn (Any): DB-API 2 connection
+        query (Union[str, Template]): A query string/template or a template name
+
+    Returns:
+        Any: Cursor
+    """
+    return get_runner(conn).execute(query, **kwargs)
+
+
+def executemany(
+    conn: Any,
+    query: Union[str, Template],
+    rows: Iterable[Mapping[str, Any]],
+    /,
+    *,
+    batch_size: int = 1000,
+) -> int:
+    """Execute a query template for each row on a DB-API 2 connection
+
+    Args:
+        conn (Any): DB-API 2 connection
+        query (Union[str, Template]): A query string/template or a template name
+        rows (Iterable[Mapping[str, Any]]): Rows (contexts)
+        batch_size (int, optional): Number of rows to execute at a time. Defaults to 1000.
+
+    Returns:
+        int: Total number of affected rows
+    """
+    return get_runner(conn).executemany(query, rows, batch_size=batch_size)
+
+
+def fetch_iter(
+    conn: Any,
+    query: Union[str, Template],
+    /,
+    *,
+    split_where_in: bool = False,
+    **kwargs: Any,
+) -> Iterator[Any]:
+    """Execute a query template on a DB-API 2 connection and stream rows
+
+    Args:
+        conn (Any): DB-API 2 connection
+        query (Union[str, Template]): A query string/template or a template name
+        split_where_in (bool, optional): Whether to split the query by its largest `where_in` list if it exceeds `max_params` (see `StatementRunner.fetch_iter`). Defaults to False.
+
+    Yields:
+        Any: Row
+    """
+    return get_runner(conn).fetch_iter(query, split_where_in=split_where_in, **kwargs)
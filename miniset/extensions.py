@@ -1,15 +1,49 @@
 # Forked from https://github.com/sripathikrishnan/jinjasql
 # The original version was created by Sripathi Krishnan and HashedIn Technologies Pvt. Ltd.
 # https://github.com/sripathikrishnan/jinjasql/blob/master/LICENSE
-from collections.abc import Generator
+import sys
+import threading
+from collections.abc import Collection, Generator, Iterable
+from typing import Callable, Optional
 
+from jinja2 import Environment, nodes
+from jinja2.compiler import CodeGenerator, Frame
 from jinja2.ext import Extension
-from jinja2.lexer import Token, TokenStream
+from jinja2.lexer import (
+    TOKEN_DOT,
+    TOKEN_LPAREN,
+    TOKEN_NAME,
+    TOKEN_PIPE,
+    TOKEN_RPAREN,
+    TOKEN_STRING,
+    TOKEN_VARIABLE_BEGIN,
+    TOKEN_VARIABLE_END,
+    Token,
+    TokenStream,
+)
+from jinja2.parser import Parser
+from jinja2.visitor import NodeTransformer
+
+# filters which should not be bound again
+NO_BIND_FILTERS = frozenset(("bind", "where_in", "sql_safe"))
+DEFAULT_PARAM_NAME = "bind#0"
+# names defined by Jinja2 itself while rendering
+IMPLICIT_NAMES = frozenset(("loop", "caller", "varargs", "kwargs", "self", "super"))
 
 
 class SqlExtension(Extension):
     """SQL extension for Jinja2"""
 
+    # bump it when the rewrite changes to invalidate bytecode caches
+    cache_version: int = 2
+
+    def __init__(self, environment: Environment) -> None:
+        super().__init__(environment)
+        # "stream" rewrites the token stream, "ast" rewrites the AST (see SqlCodeGenerator)
+        environment.extend(sql_rewrite_mode="stream")
+        # param names of the variable blocks of the last parsed template in "ast" mode (see pop_param_names)
+        self._parsed = threading.local()
+
     def extract_param_name(self, tokens: list[Token]) -> str:
         """Extract param names
 
@@ -19,21 +53,16 @@ class SqlExtension(Extension):
         Returns:
             str: Param name
         """
-        name: str = ""
-
         for token in tokens:
-            if token.test("variable_begin"):
+            if token.type == TOKEN_VARIABLE_BEGIN:
                 continue
 
-            if token.test("name") or token.test("dot"):
-                name += token.value
+            if token.type == TOKEN_NAME or token.type == TOKEN_DOT:
+                return sys.intern(token.value)
 
             break
 
-        if not name:
-            name = "bind#0"
-
-        return name
+        return DEFAULT_PARAM_NAME
 
     def filter_stream(self, stream: TokenStream) -> Generator[Token, None, None]:
         """Convert `{{ some.variable | filter1 | filter 2 }}` to `{{ ( some.variable | filter1 | filter 2 ) | bind }}` for all variable declarations in the template
@@ -49,39 +78,315 @@ class SqlExtension(Extension):
         Yields:
             Generator[Token, None, None]: Converted token stream
         """
+        if getattr(self.environment, "sql_rewrite_mode", "stream") != "stream":
+            yield from self._record_param_names(stream)
+            return
+
+        tokens = iter(stream)
+        for token in tokens:
+            if token.type != TOKEN_VARIABLE_BEGIN:
+                yield token
+                continue
+
+            variable_begin = token
+            var_expr: list[Token] = []
+            token = next(tokens)
+            while token.type != TOKEN_VARIABLE_END:
+                var_expr.append(token)
+                token = next(tokens)
+
+            variable_end = token
 
-        while not stream.eos:
-            token = next(stream)
-            if token.test("variable_begin"):
-                var_expr: list[Token] = []
-
-                while not token.test("variable_end"):
-                    var_expr.append(token)
-                    token = next(stream)
-
-                variable_end = token
-
-                last_token = var_expr[-1]
-                lineno = last_token.lineno
-                # don't bind twice
-                if not last_token.test("name") or last_token.value not in (
-                    "bind",
-                    "where_in",
-                    "sql_safe",
-                ):
-                    param_name = self.extract_param_name(var_expr)
-
-                    var_expr.insert(1, Token(lineno, "lparen", "("))
-                    var_expr.append(Token(lineno, "rparen", ")"))
-                    var_expr.append(Token(lineno, "pipe", "|"))
-                    var_expr.append(Token(lineno, "name", "bind"))
-                    var_expr.append(Token(lineno, "lparen", "("))
-                    var_expr.append(Token(lineno, "string", param_name))
-                    var_expr.append(Token(lineno, "rparen", ")"))
-
-                var_expr.append(variable_end)
-
-                for token in var_expr:
-                    yield token
-            else:
+            yield variable_begin
+
+            last_token = var_expr[-1] if var_expr else variable_begin
+            # don't bind twice
+            if last_token.type == TOKEN_NAME and last_token.value in NO_BIND_FILTERS:
+                yield from var_expr
+                yield variable_end
+                continue
+
+            lineno = last_token.lineno
+            param_name = self.extract_param_name(var_expr)
+
+            yield Token(lineno, TOKEN_LPAREN, "(")
+            yield from var_expr
+            yield Token(lineno, TOKEN_RPAREN, ")")
+            yield Token(lineno, TOKEN_PIPE, "|")
+            yield Token(lineno, TOKEN_NAME, "bind")
+            yield Token(lineno, TOKEN_LPAREN, "(")
+            yield Token(lineno, TOKEN_STRING, param_name)
+            yield Token(lineno, TOKEN_RPAREN, ")")
+            yield variable_end
+
+    def _record_param_names(self, stream: TokenStream) -> Generator[Token, None, None]:
+        # the AST drops parentheses and operators, so names are taken from the tokens
+        # with the same rule as the stream rewrite, in the order of variable blocks
+        names: list[str] = []
+        self._parsed.param_names = names
+        tokens = iter(stream)
+        for token in tokens:
+            yield token
+            if token.type == TOKEN_VARIABLE_BEGIN:
+                token = next(tokens)
+                names.append(self.extract_param_name([token]))
                 yield token
+
+    def pop_param_names(self) -> Optional[list[str]]:
+        """Pop the param names of the variable blocks of the template parsed last in this thread
+
+        Returns:
+            Optional[list[str]]: Param names in the order of variable blocks. None if no template was parsed in "ast" mode.
+        """
+        names: Optional[list[str]] = getattr(self._parsed, "param_names", None)
+        self._parsed.param_names = None
+        return names
+
+
+def extract_node_param_name(node: nodes.Expr) -> str:
+    """Extract a param name from the leftmost name of an expression (the AST counterpart of SqlExtension.extract_param_name)
+
+    Parentheses are not kept in the AST, so the name may differ from the stream rewrite for
+    parenthesized expressions. BindTransformer prefers the names recorded by SqlExtension.
+
+    Args:
+        node (nodes.Expr): Expression node
+
+    Returns:
+        str: Param name
+    """
+    current: Optional[nodes.Node] = node
+    while current is not None:
+        if isinstance(current, nodes.Name):
+            return sys.intern(current.name)
+
+        if isinstance(current, nodes.Not):
+            return "not"
+
+        if isinstance(
+            current,
+            (nodes.Getattr, nodes.Getitem, nodes.Filter, nodes.Test, nodes.Call),
+        ):
+            current = current.node
+        elif isinstance(current, nodes.BinExpr):
+            current = current.left
+        elif isinstance(current, nodes.Concat):
+            current = current.nodes[0] if current.nodes else None
+        elif isinstance(current, nodes.CondExpr):
+            current = current.expr1
+        else:
+            break
+
+    return DEFAULT_PARAM_NAME
+
+
+class BindTransformer(NodeTransformer):
+    """Wrap expressions in output nodes with a bind filter (the AST counterpart of SqlExtension.filter_stream)
+
+    Args:
+        param_names (Optional[Iterable[str]], optional): Param names of the variable blocks in order
+            (see SqlExtension.pop_param_names). Names are extracted from the AST if not given. Defaults to None.
+    """
+
+    def __init__(self, param_names: Optional[Iterable[str]] = None) -> None:
+        self.param_names = iter(param_names) if param_names is not None else None
+
+    def visit_Output(self, node: nodes.Output) -> nodes.Output:  # noqa: N802
+        node.nodes = [self._bind(child) for child in node.nodes]
+        # output nodes may contain nested output nodes (e.g. macros in call blocks)
+        self.generic_visit(node)
+        return node
+
+    def _bind(self, node: nodes.Expr) -> nodes.Expr:
+        if isinstance(node, nodes.TemplateData):
+            return node
+
+        param_name = next(self.param_names, None) if self.param_names else None
+        if isinstance(node, nodes.Filter) and node.name in NO_BIND_FILTERS:
+            return node
+
+        return nodes.Filter(
+            node,
+            "bind",
+            [nodes.Const(param_name or extract_node_param_name(node))],
+            [],
+            None,
+            None,
+            lineno=node.lineno,
+        )
+
+
+def extract_node_lookup(
+    node: nodes.Expr, *, exclude: Collection[str] = ()
+) -> Optional[str]:
+    """Extract a lookup path (e.g. `a.b['c']`) from a plain lookup expression
+
+    Args:
+        node (nodes.Expr): Expression node
+        exclude (Collection[str], optional): Variable names not to extract lookups of. Defaults to ().
+
+    Returns:
+        Optional[str]: Lookup path. None if the expression is not a plain lookup of a variable (or the variable is excluded).
+    """
+    path: list[str] = []
+    while True:
+        if isinstance(node, nodes.Getattr):
+            path.append(f".{node.attr}")
+        elif isinstance(node, nodes.Getitem) and isinstance(node.arg, nodes.Const):
+            path.append(f"[{node.arg.value!r}]")
+        else:
+            break
+
+        node = node.node
+
+    if not isinstance(node, nodes.Name) or node.name in exclude:
+        return None
+
+    return node.name + "".join(reversed(path))
+
+
+def find_assigned_names(node: nodes.Template) -> set[str]:
+    """Find names assigned in a template (e.g. loop variables, `set`, macro arguments and imports)
+
+    Args:
+        node (nodes.Template): Template node
+
+    Returns:
+        set[str]: Assigned names
+    """
+    names = set(IMPLICIT_NAMES)
+    for item in node.find_all(
+        (nodes.Name, nodes.Import, nodes.FromImport, nodes.Macro)
+    ):
+        if isinstance(item, nodes.Name):
+            if item.ctx in ("store", "param"):
+                names.add(item.name)
+        elif isinstance(item, nodes.Import):
+            names.add(item.target)
+        elif isinstance(item, nodes.FromImport):
+            names.update(
+                name if isinstance(name, str) else name[1] for name in item.names
+            )
+        elif isinstance(item, nodes.Macro):
+            names.add(item.name)
+
+    return names
+
+
+class LookupAnnotator(NodeTransformer):
+    """Pass the lookup path of each bound variable to the bind filter (`bind(key, lookup)`) to dedupe params
+
+    Only lookups of variables which are not assigned in the template are annotated,
+    so that a lookup path refers to the same value while the template is rendered with a context.
+    """
+
+    def __init__(self, assigned: set[str]) -> None:
+        self.assigned = assigned
+
+    def visit_Filter(self, node: nodes.Filter) -> nodes.Filter:  # noqa: N802
+        self.generic_visit(node)
+        if (
+            node.name != "bind"
+            or node.node is None
+            or len(node.args) != 1
+            or node.kwargs
+            or node.dyn_args is not None
+            or node.dyn_kwargs is not None
+        ):
+            return node
+
+        lookup = extract_node_lookup(node.node, exclude=self.assigned)
+        if lookup is None:
+            return node
+
+        node.args = [*node.args, nodes.Const(lookup, lineno=node.lineno)]
+        return node
+
+
+class SqlCodeGenerator(CodeGenerator):
+    """Code generator binding output expressions at the AST level instead of rewriting the token stream,
+    and annotating bind filters with lookup paths to dedupe params"""
+
+    def visit_Template(  # noqa: N802
+        self, node: nodes.Template, frame: Optional[Frame] = None
+    ) -> None:
+        if getattr(self.environment, "sql_rewrite_mode", "stream") == "ast":
+            node = BindTransformer(pop_param_names(self.environment)).visit(node)
+
+        if getattr(self.environment, "sql_dedupe_params", False):
+            node = LookupAnnotator(find_assigned_names(node)).visit(node)
+
+        super().visit_Template(node, frame)
+
+
+def pop_param_names(env: Environment) -> Optional[list[str]]:
+    """Pop the param names recorded while parsing a template in "ast" mode (see SqlExtension.pop_param_names)
+
+    Args:
+        env (Environment): Jinja2 environment
+
+    Returns:
+        Optional[list[str]]: Param names in the order of variable blocks. None if SqlExtension is not loaded.
+    """
+    extension = env.extensions.get(SqlExtension.identifier)
+    if not isinstance(extension, SqlExtension):
+        return None
+
+    return extension.pop_param_names()
+
+
+def enable_ast_rewrite(env: Environment) -> None:
+    """Switch SqlExtension's rewrite from the token stream level to the AST level
+
+    Args:
+        env (Environment): Jinja2 environment
+    """
+    env.sql_rewrite_mode = "ast"  # type: ignore
+    env.code_generator_class = SqlCodeGenerator
+
+
+def enable_param_dedupe(env: Environment) -> None:
+    """Annotate bind filters with the lookup paths of bound variables to dedupe params
+
+    Args:
+        env (Environment): Jinja2 environment
+    """
+    env.sql_dedupe_params = True  # type: ignore
+    env.code_generator_class = SqlCodeGenerator
+
+
+QueryHandler = Callable[[str, Callable[[], str]], str]
+
+
+class QueryExtension(Extension):
+    """Extension to declare named statements in a template
+
+    ```
+    {% query "users" %}SELECT * FROM users WHERE id = {{ id }}{% endquery %}
+    {% query "orders" %}SELECT * FROM orders WHERE user_id = {{ id }}{% endquery %}
+    ```
+
+    A statement is rendered in place unless the environment has a query handler
+    (see `JinjaTemplateProcessor.prepare_bundle`).
+    """
+
+    tags = {"query"}  # noqa: RUF012
+
+    def __init__(self, environment: Environment) -> None:
+        super().__init__(environment)
+        environment.extend(sql_query_handler=None)
+
+    def parse(self, parser: Parser) -> nodes.Node:
+        lineno = next(parser.stream).lineno
+        name = parser.parse_expression()
+        body = parser.parse_statements(("name:endquery",), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method("_query", [name]), [], [], body
+        ).set_lineno(lineno)
+
+    def _query(self, name: str, caller: Callable[[], str]) -> str:
+        handler: Optional[QueryHandler] = self.environment.sql_query_handler  # type: ignore
+        if handler is None:
+            return caller()
+
+        return handler(name, caller)
@@ -0,0 +1,164 @@
+import re
+from hashlib import blake2b
+from threading import Lock
+from typing import Any, Callable, NamedTuple, Union
+
+# placeholders of all the param styles
+PLACEHOLDER = r"(?:\?|%s|:\d+|\$\d+|:[A-Za-z_][\w#]*|%\([^)]+\)s)"
+PLACEHOLDER_LIST_PATTERN = re.compile(
+    rf"\(\s*{PLACEHOLDER}(?:\s*,\s*{PLACEHOLDER})*\s*\)"
+)
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def fingerprint(source: str) -> str:
+    """Compute a stable fingerprint of a template source (or a template name)
+
+    Args:
+        source (str): Template source
+
+    Returns:
+        str: Fingerprint
+    """
+    return blake2b(source.encode(), digest_size=8).hexdigest()
+
+
+def fingerprint_query(template_fingerprint: str, query: str) -> str:
+    """Compute a fingerprint of a prepared query (its SQL shape)
+
+    Args:
+        template_fingerprint (str): Fingerprint of the template
+        query (str): Prepared query
+
+    Returns:
+        str: Fingerprint
+    """
+    return blake2b(
+        f"{template_fingerprint}\x00{query}".encode(), digest_size=8
+    ).hexdigest()
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a prepared query to group similar ones (e.g. in query logs)
+
+    Lists of placeholders (e.g. `where_in` clauses) are collapsed into `(...)` and whitespace is squashed.
+
+    Args:
+        query (str): Prepared query
+
+    Returns:
+        str: Normalized query
+    """
+    query = PLACEHOLDER_LIST_PATTERN.sub("(...)", query)
+    return WHITESPACE_PATTERN.sub(" ", query).strip()
+
+
+class FingerprintedQuery(NamedTuple):
+    """A prepared query with the fingerprint of its SQL shape
+
+    Attributes:
+        query (str): Prepared query
+        bind_params (Union[list[Any], dict[str, Any]]): Bind params
+        fingerprint (str): Stable fingerprint of the SQL shape (the same for the same query regardless of bind param values)
+        normalized (str): Normalized query (see `normalize_query`)
+    """
+
+    query: str
+    bind_params: Union[list[Any], dict[str, Any]]
+    fingerprint: str
+    normalized: str
+
+
+class RenderEvent(NamedTuple):
+    """Metrics of a render
+
+    Attributes:
+        fingerprint (str): Stable fingerprint of the template
+        compile_time (float): Seconds to compile (or to get a cached) template
+        validation_time (float): Seconds to validate the context
+        render_time (float): Seconds to render the template
+        bind_count (int): Number of bind params
+        where_in_sizes (tuple[int, ...]): Number of values passed to each where_in filter
+        sql_length (int): Length of the rendered query
+    """
+
+    fingerprint: str
+    compile_time: float
+    validation_time: float
+    render_time: float
+    bind_count: int
+    where_in_sizes: tuple[int, ...]
+    sql_length: int
+
+
+RenderCallback = Callable[[RenderEvent], Any]
+
+
+class TemplateStats:
+    """Aggregated metrics of a template"""
+
+    __slots__ = (
+        "count",
+        "max_bind_count",
+        "max_render_time",
+        "max_sql_length",
+        "max_where_in_size",
+        "total_compile_time",
+        "total_render_time",
+        "total_validation_time",
+    )
+
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.total_compile_time: float = 0.0
+        self.total_validation_time: float = 0.0
+        self.total_render_time: float = 0.0
+        self.max_render_time: float = 0.0
+        self.max_bind_count: int = 0
+        self.max_where_in_size: int = 0
+        self.max_sql_length: int = 0
+
+    def add(self, event: RenderEvent) -> None:
+        self.count += 1
+        self.total_compile_time += event.compile_time
+        self.total_validation_time += event.validation_time
+        self.total_render_time += event.render_time
+        self.max_render_time = max(self.max_render_time, event.render_time)
+        self.max_bind_count = max(self.max_bind_count, event.bind_count)
+        self.max_where_in_size = max(
+            self.max_where_in_size, max(event.where_in_sizes, default=0)
+        )
+        self.max_sql_length = max(self.max_sql_length, event.sql_length)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class RenderStats:
+    """Render callback aggregating metrics per template fingerprint"""
+
+    def __init__(self) -> None:
+        self._stats: dict[str, TemplateStats] = {}
+        self._lock = Lock()
+
+    def __call__(self, event: RenderEvent) -> None:
+        with self._lock:
+            stats = self._stats.get(event.fingerprint)
+            if stats is None:
+                stats = self._stats[event.fingerprint] = TemplateStats()
+
+            stats.add(event)
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        """Get aggregated metrics
+
+        Returns:
+            dict[str, dict[str, Any]]: Metrics per template fingerprint
+        """
+        with self._lock:
+            return {key: stats.to_dict() for key, stats in self._stats.items()}
+
+    def clear(self) -> None:
+        """Clear aggregated metrics"""
+        with self._lock:
+            self._stats.clear()
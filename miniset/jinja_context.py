@@ -4,35 +4,68 @@
 # Forked from https://github.com/sripathikrishnan/jinjasql
 # The original version was created by Sripathi Krishnan and HashedIn Technologies Pvt. Ltd.
 # https://github.com/sripathikrishnan/jinjasql/blob/master/LICENSE
-from collections import OrderedDict
-from collections.abc import Generator
+import inspect
+import os
+import re
+from collections.abc import (
+    AsyncIterable,
+    Awaitable,
+    Collection,
+    Generator,
+    Hashable,
+    Iterable,
+    Iterator,
+    Mapping,
+    Sequence,
+)
 from contextlib import contextmanager
+from contextvars import ContextVar
+from copy import deepcopy
+from hashlib import sha1
+from time import perf_counter
 from typing import Any, Callable, Optional, Union
+from weakref import WeakKeyDictionary
 
-from jinja2 import DebugUndefined, Environment, Template
+from jinja2 import (
+    BaseLoader,
+    DebugUndefined,
+    Environment,
+    StrictUndefined,
+    Template,
+    TemplateNotFound,
+    nodes,
+    pass_context,
+)
+from jinja2.runtime import Context
 from jinja2.sandbox import SandboxedEnvironment
-from markupsafe import Markup
+from jinja2.utils import missing
+from markupsafe import Markup, escape
 
 from . import types
-from .exceptions import MinisetTemplateException
-from .extensions import SqlExtension
+from .analysis import TemplateAnalysis, analyze_template
+from .bytecode import SqlBytecodeCache, build_cache_key_prefix
+from .cache import CacheInfo, LRUCache, freeze
+from .exceptions import MinisetTemplateException, MinisetUndefinedException
+from .extensions import (
+    BindTransformer,
+    QueryExtension,
+    SqlExtension,
+    enable_ast_rewrite,
+    enable_param_dedupe,
+    pop_param_names,
+)
 from .filters import build_identifier_filter, sql_safe
-
-NONE_TYPE = type(None).__name__
-ALLOWED_TYPES = (
-    NONE_TYPE,
-    "bool",
-    "str",
-    "unicode",
-    "int",
-    "long",
-    "float",
-    "list",
-    "dict",
-    "tuple",
-    "set",
+from .instrumentation import (
+    FingerprintedQuery,
+    RenderCallback,
+    RenderEvent,
+    fingerprint,
+    fingerprint_query,
+    normalize_query,
 )
-
+from .plan import BindSite, QueryPlan, find_static_segments
+from .stream import DEFAULT_CHUNK_SIZE, QueryStream, Writable
+from .validation import DEFAULT_VALIDATOR, ContextValidator
 
 PARAM_STYLE_TO_PLACEHOLDER: dict[types.ParamStyleType, Callable[[str, int], str]] = {
     "qmark": lambda _k, _i: "?",
@@ -44,35 +77,205 @@ PARAM_STYLE_TO_PLACEHOLDER: dict[types.ParamStyleType, Callable[[str, int], str]
 }
 
 
-def dict_cast(bind_params: OrderedDict) -> dict[Any, Any]:
-    return dict(bind_params)
+# placeholder formats for binding many values at once.
+# "{}" is replaced with a param key for named styles or a param index for numeric styles.
+PARAM_STYLE_TO_PLACEHOLDER_FORMAT: dict[types.ParamStyleType, str] = {
+    "qmark": "?",
+    "format": "%s",
+    "numeric": ":{}",
+    "named": ":{}",
+    "pyformat": "%({})s",
+    "asyncpg": "${}",
+}
 
 
-def list_cast(bind_params: OrderedDict) -> list[Any]:
-    return list(bind_params.values())
+# a query string without whitespace and Jinja2 delimiters is regarded as a template name
+# if the environment has a loader and the loader finds it
+TEMPLATE_NAME_PATTERN = re.compile(r"[^\s{}]+")
 
+# bind param values copied when they are returned from the result cache
+MUTABLE_PARAM_TYPES = frozenset((list, dict, set))
 
-PARAM_STYLE_TO_CAST: dict[
-    types.ParamStyleType, Callable[[OrderedDict], Union[dict[Any, Any], list[Any]]]
-] = {
-    "qmark": list_cast,
-    "format": list_cast,
-    "numeric": list_cast,
-    "named": dict_cast,
-    "pyformat": dict_cast,
-    "asyncpg": list_cast,
-}
+ARRAY_PARAM_STYLES: tuple[types.ParamStyleType, ...] = ("numeric", "asyncpg")
+NUMERIC_PARAM_STYLES: tuple[types.ParamStyleType, ...] = ("numeric", "asyncpg")
+NAMED_PARAM_STYLES: tuple[types.ParamStyleType, ...] = ("named", "pyformat")
+# param styles that can reference a param multiple times
+DEDUPE_PARAM_STYLES: tuple[types.ParamStyleType, ...] = (
+    *NUMERIC_PARAM_STYLES,
+    *NAMED_PARAM_STYLES,
+)
+
+
+def as_sized_iterable(values: Iterable[Any]) -> Collection[Any]:
+    """Convert values into a sized iterable without copying them as far as possible
+
+    Args:
+        values (Iterable[Any]): Values
+
+    Returns:
+        Collection[Any]: Sized iterable
+    """
+    if type(values).__module__ == "numpy":
+        # convert NumPy scalars into Python ones that DB drivers can handle
+        return values.tolist()  # type: ignore
+
+    if isinstance(values, Collection):
+        return values
+
+    return list(values)
+
+
+async def resolve_async_values(context: dict[str, Any]) -> dict[str, Any]:
+    """Resolve awaitable values and async iterables (into lists) in a context concurrently
+
+    Args:
+        context (dict[str, Any]): Context
+
+    Returns:
+        dict[str, Any]: Resolved context
+    """
+
+    # asyncio is imported only when it is used because importing it is expensive
+    import asyncio
+
+    async def collect(values: AsyncIterable[Any]) -> list[Any]:
+        return [v async for v in values]
+
+    keys: list[str] = []
+    awaitables: list[Awaitable[Any]] = []
+    for key, value in context.items():
+        if inspect.isawaitable(value):
+            keys.append(key)
+            awaitables.append(value)
+        elif isinstance(value, AsyncIterable):
+            keys.append(key)
+            awaitables.append(collect(value))
+
+    if not awaitables:
+        return context
+
+    resolved = await asyncio.gather(*awaitables)
+    return {**context, **dict(zip(keys, resolved))}
+
+
+def unfoldable(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap a filter not to be evaluated while compiling a template
+
+    Jinja2 evaluates filters with constant arguments at compile time. Templates included or imported
+    while rendering are compiled while a bind state is active, so a folded bind filter would add a param
+    to the current render and bake its placeholder into the compiled template.
+    Filters taking a context are never evaluated at compile time.
+
+    Args:
+        func (Callable[..., Any]): Filter
+
+    Returns:
+        Callable[..., Any]: Filter taking a context
+    """
+
+    @pass_context
+    def wrapper(_context: Context, *args: Any, **kwargs: Any) -> Any:
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+def context_filter(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap a function taking a Jinja2 context as its first argument as a filter
+
+    Like `unfoldable`, the filter is never evaluated at compile time.
+
+    Args:
+        func (Callable[..., Any]): Function taking a context
+
+    Returns:
+        Callable[..., Any]: Filter taking a context
+    """
+
+    @pass_context
+    def wrapper(context: Context, *args: Any, **kwargs: Any) -> Any:
+        return func(context, *args, **kwargs)
+
+    return wrapper
 
 
 def validate_context_types(context: dict[str, Any]) -> dict[str, Any]:
-    for key in context:
-        arg_type = type(context[key]).__name__
-        if arg_type not in ALLOWED_TYPES:
-            raise MinisetTemplateException(
-                f"Unsafe template value for key {key}: {arg_type}"
-            )
+    return DEFAULT_VALIDATOR.validate(context)
+
 
-    return context
+class BindState:
+    """Bind params collected while rendering a template"""
+
+    __slots__ = (
+        "index",
+        "params",
+        "placeholders",
+        "where_in_calls",
+        "where_in_sizes",
+        "where_in_slice",
+    )
+
+    def __init__(self, *, named: bool = False) -> None:
+        """Initialize the bind state.
+
+        Args:
+            named (bool, optional): Whether to collect bind params into a dict (for named param styles) or a list. Defaults to False.
+        """
+        self.index: int = 0
+        self.params: Union[list[Any], dict[str, Any]] = {} if named else []
+        # placeholders by (Jinja2 context, lookup path) to dedupe params if enabled.
+        # a context is a scope (e.g. each include has its own) in which a lookup path refers to the same value.
+        self.placeholders: Optional[dict[tuple[Context, str], str]] = None
+        # recorded only if instrumentation is enabled
+        self.where_in_sizes: Optional[list[int]] = None
+        # recorded only while splitting a query into chunks:
+        # (number of values, number of bound params, mode) of each where_in call
+        self.where_in_calls: Optional[list[tuple[int, int, types.WhereInModeType]]] = (
+            None
+        )
+        # (index of a where_in call, values to bind) to render a chunk of a query
+        self.where_in_slice: Optional[tuple[int, slice]] = None
+
+
+class SqlStrictUndefined(StrictUndefined):
+    """Undefined raising MinisetUndefinedException when it is used"""
+
+    __slots__ = ()
+
+    def __init__(
+        self,
+        hint: Optional[str] = None,
+        obj: Any = missing,
+        name: Optional[str] = None,
+        exc: type[Exception] = MinisetUndefinedException,
+    ) -> None:
+        super().__init__(hint, obj, name, exc)  # type: ignore
+
+    # StrictUndefined iterates as empty in async templates
+    __aiter__ = StrictUndefined._fail_with_undefined_error  # type: ignore
+
+
+class BundleState:
+    """Statements collected while rendering a query bundle"""
+
+    __slots__ = ("names", "statements")
+
+    def __init__(self, names: Optional[Iterable[str]] = None) -> None:
+        """Initialize the bundle state.
+
+        Args:
+            names (Optional[Iterable[str]], optional): Names of statements to render. Defaults to None (all).
+        """
+        self.names: Optional[frozenset[str]] = (
+            None if names is None else frozenset(names)
+        )
+        self.statements: dict[str, tuple[str, Union[list[Any], dict[str, Any]]]] = {}
+
+
+# bind state is kept per render (not per processor) so that a processor can be
+# shared across threads and asyncio tasks
+_bind_state: ContextVar[BindState] = ContextVar("miniset_bind_state")
+_bundle_state: ContextVar[BundleState] = ContextVar("miniset_bundle_state")
 
 
 class JinjaTemplateProcessor:
@@ -82,6 +285,20 @@ class JinjaTemplateProcessor:
         param_style: types.ParamStyleType = "format",
         identifier_quote_character: types.IdentifierQuoteCharacterType = '"',
         env: Optional[Environment] = None,
+        cache_size: int = 128,
+        where_in_mode: types.WhereInModeType = "expand",
+        bytecode_cache_dir: Optional[Union[str, os.PathLike]] = None,
+        loader: Optional[BaseLoader] = None,
+        auto_reload: bool = True,
+        validator: Optional[ContextValidator] = None,
+        offload_threshold: Optional[int] = None,
+        on_render: Optional[RenderCallback] = None,
+        rewrite_mode: types.RewriteModeType = "stream",
+        max_params: Optional[int] = None,
+        dedupe_params: bool = False,
+        result_cache_size: int = 0,
+        result_cache_ttl: Optional[float] = None,
+        strict: bool = False,
     ) -> None:
         """Initialize the template processor.
 
@@ -89,55 +306,403 @@ class JinjaTemplateProcessor:
             param_style (types.ParamStyleType, optional): Parameter style. Defaults to "format".
             identifier_quote_character (types.IdentifierQuoteCharacterType, optional): Identifier for quote character. Defaults to '"'.
             env (Optional[Environment], optional): Jinja2 environment. Defaults to None.
+            cache_size (int, optional): Max number of compiled templates to cache. 0 disables the cache. Defaults to 128.
+            where_in_mode (types.WhereInModeType, optional): Default mode of where_in filter. Defaults to "expand".
+            bytecode_cache_dir (Optional[Union[str, os.PathLike]], optional): Directory to persist compiled templates across processes. Defaults to None.
+            loader (Optional[BaseLoader], optional): Jinja2 loader to load named templates (e.g. FileSystemLoader, PackageLoader). Defaults to None.
+            auto_reload (bool, optional): Whether to recompile named templates when their sources change. Only set if `loader` is given. Defaults to True.
+            validator (Optional[ContextValidator], optional): Context validator. Defaults to None (a validator allowing the default types).
+            offload_threshold (Optional[int], optional): Number of collection items in a context to offload async rendering to a thread. Defaults to None (never offload).
+            on_render (Optional[RenderCallback], optional): Callback to receive metrics of each render. Defaults to None.
+            rewrite_mode (types.RewriteModeType, optional): Whether to bind output expressions by rewriting the token stream or the AST. Defaults to "stream".
+            max_params (Optional[int], optional): Max number of bind params in a query (e.g. 32766 for SQLite, 65535 for PostgreSQL). Defaults to None (unlimited).
+            dedupe_params (bool, optional): Whether to reuse a param for the same lookup of a variable (e.g. `{{ request.id }}`) in a template. Ignored by qmark and format param styles. Defaults to False.
+            result_cache_size (int, optional): Max number of prepared queries to cache by template and context. 0 disables the cache. Defaults to 0.
+            result_cache_ttl (Optional[float], optional): Seconds to keep a prepared query in the cache. Defaults to None (no expiration).
+            strict (bool, optional): Whether to raise MinisetUndefinedException on undefined variables instead of leaving them in the query. Defaults to False.
         """
+        if max_params is not None and max_params < 1:
+            raise ValueError("max_params must be greater than 0")
+
         self._context: dict[str, Any] = {}
 
         self._env = env or SandboxedEnvironment(undefined=DebugUndefined)
+        if strict:
+            self._env.undefined = SqlStrictUndefined
         self._env.autoescape = True
         self._env.add_extension(SqlExtension)
-        self._env.filters["bind"] = self._bind
-        self._env.filters["where_in"] = self._where_in
+        self._env.add_extension(QueryExtension)
+        self._env.sql_query_handler = self._render_statement  # type: ignore
+        if rewrite_mode == "ast":
+            enable_ast_rewrite(self._env)
+        self._dedupe_params = dedupe_params and param_style in DEDUPE_PARAM_STYLES
+        if self._dedupe_params:
+            enable_param_dedupe(self._env)
+        self._env.filters["bind"] = context_filter(self._bind)
+        self._env.filters["where_in"] = unfoldable(self._where_in)
         self._env.filters["sql_safe"] = sql_safe
         self._env.filters["identifier"] = build_identifier_filter(
             identifier_quote_character
         )
 
+        if loader is not None:
+            self._env.loader = loader
+            # compile each named template only once per process
+            self._env.cache = {}
+            # not to override the setting of a given environment without a loader
+            self._env.auto_reload = auto_reload
+
+        self._validator = validator or ContextValidator()
+
         self._param_style: types.ParamStyleType = param_style
+        self._where_in_mode: types.WhereInModeType = where_in_mode
+
+        self._template_cache: LRUCache[Template] = LRUCache(cache_size)
+        self._analyses: LRUCache[TemplateAnalysis] = LRUCache(cache_size)
+        self._result_cache_size = result_cache_size
+        # prepared queries, their bind params and whether the bind params have mutable values
+        self._result_cache: LRUCache[
+            tuple[str, Union[list[Any], dict[str, Any]], bool]
+        ] = LRUCache(result_cache_size, ttl=result_cache_ttl)
+
+        self._settings: dict[str, Any] = {
+            "param_style": param_style,
+            "identifier_quote_character": identifier_quote_character,
+            "where_in_mode": where_in_mode,
+            "rewrite_mode": rewrite_mode,
+            "dedupe_params": self._dedupe_params,
+        }
+
+        self._bytecode_cache_dir = bytecode_cache_dir
+        if bytecode_cache_dir is not None:
+            os.makedirs(bytecode_cache_dir, exist_ok=True)
+            self._env.bytecode_cache = self._build_bytecode_cache(self._env)
+
+        self._async_env: Optional[Environment] = None
+        self._offload_threshold = offload_threshold
+
+        self._on_render = on_render
+        self._max_params = max_params
+        # sources of templates compiled from strings to fingerprint them
+        self._sources: WeakKeyDictionary[Template, str] = WeakKeyDictionary()
+        self._fingerprints: WeakKeyDictionary[Template, str] = WeakKeyDictionary()
+        # plans by query strings or template names (plans hold their templates)
+        self._plans: LRUCache[QueryPlan] = LRUCache(cache_size)
+        # normalized queries by their fingerprints
+        self._normalized: LRUCache[str] = LRUCache(cache_size)
+
+    def _build_bytecode_cache(self, env: Environment) -> SqlBytecodeCache:
+        return SqlBytecodeCache(
+            self._bytecode_cache_dir,
+            key_prefix=build_cache_key_prefix(env, **self._settings),
+        )
+
+    def _get_bind_state(self) -> BindState:
+        try:
+            return _bind_state.get()
+        except LookupError as e:
+            raise MinisetTemplateException(
+                "bind params can only be used while preparing a query", exception=e
+            ) from e
+
+    def _bind_param(
+        self,
+        key: str,
+        value: Any,
+        *,
+        context: Optional[Context] = None,
+        lookup: Optional[str] = None,
+    ) -> str:
+        state = self._get_bind_state()
+
+        placeholders = state.placeholders
+        if placeholders is None or context is None or lookup is None:
+            return self._bind_new_param(state, key, value)
+
+        # the same lookup in the same context is the same value
+        ident = (context, lookup)
+        placeholder = placeholders.get(ident)
+        if placeholder is None:
+            placeholder = placeholders[ident] = self._bind_new_param(state, key, value)
+
+        return placeholder
+
+    def _bind_new_param(self, state: BindState, key: str, value: Any) -> str:
+        state.index += 1
+        params = state.params
+        if isinstance(params, dict):
+            new_key = f"{key}_{state.index}"
+            params[new_key] = value
+            return PARAM_STYLE_TO_PLACEHOLDER[self._param_style](new_key, state.index)
 
-        self._param_index: int = 0
-        self._bind_params: OrderedDict[str, Any] = OrderedDict()
+        params.append(value)
+        return PARAM_STYLE_TO_PLACEHOLDER[self._param_style](key, state.index)
 
-    def _bind_param(self, key: str, value: Any) -> str:
-        self._param_index += 1
-        new_key = f"{key}_{self._param_index}"
-        self._bind_params[new_key] = value
+    def _bind_many(self, key: str, values: Collection[Any]) -> str:
+        state = self._get_bind_state()
 
-        return PARAM_STYLE_TO_PLACEHOLDER[self._param_style](new_key, self._param_index)
+        start = state.index + 1
+        stop = start + len(values)
+        state.index = stop - 1
 
-    def _bind(self, value: Any, key: str) -> Union[Markup, str]:
+        placeholder = PARAM_STYLE_TO_PLACEHOLDER_FORMAT[self._param_style]
+        params = state.params
+        if isinstance(params, dict):
+            keys = [f"{key}_{i}" for i in range(start, stop)]
+            params.update(zip(keys, values))
+            return ",".join(map(placeholder.format, keys))
+
+        params.extend(values)
+
+        if self._param_style in NUMERIC_PARAM_STYLES:
+            return ",".join(map(placeholder.format, range(start, stop)))
+
+        return ",".join([placeholder] * len(values))
+
+    def _bind(
+        self, context: Context, value: Any, key: str, lookup: Optional[str] = None
+    ) -> Union[Markup, str]:
         if isinstance(value, Markup):
             return value
 
-        return self._bind_param(key, value)
+        if isinstance(value, SqlStrictUndefined):
+            # binding does not use the value, so raise explicitly in strict mode
+            value._fail_with_undefined_error()
+
+        return self._bind_param(key, value, context=context, lookup=lookup)
+
+    def _where_in(
+        self,
+        values: Iterable[Any],
+        *,
+        null_if_empty: bool = False,
+        mode: Optional[types.WhereInModeType] = None,
+    ) -> Markup:
+        mode = mode or self._where_in_mode
+        values = as_sized_iterable(values)
+
+        state = self._get_bind_state()
+        calls = state.where_in_calls
+        if calls is None:
+            return self._where_in_values(state, values, null_if_empty, mode)
+
+        size = len(values)
+        if state.where_in_slice is not None and state.where_in_slice[0] == len(calls):
+            selected = state.where_in_slice[1]
+            values = (
+                values[selected]
+                if isinstance(values, Sequence)
+                else list(values)[selected]
+            )
+
+        start = state.index
+        clause = self._where_in_values(state, values, null_if_empty, mode)
+        calls.append((size, state.index - start, mode))
+        return clause
+
+    def _where_in_values(
+        self,
+        state: BindState,
+        values: Collection[Any],
+        null_if_empty: bool,
+        mode: types.WhereInModeType,
+    ) -> Markup:
+        if state.where_in_sizes is not None:
+            state.where_in_sizes.append(len(values))
+        if mode == "array":
+            if self._param_style not in ARRAY_PARAM_STYLES:
+                raise MinisetTemplateException(
+                    f"where_in array mode is not supported by {self._param_style} param style"
+                )
+
+            return Markup(f"= ANY({self._bind_param('where_in', list(values))})")
 
-    def _where_in(self, values: list[Any], *, null_if_empty: bool = False) -> str:
         if len(values) == 0 and null_if_empty:
             return sql_safe("(NULL)")
 
-        results = [self._bind_param("where_in", v) for v in values]
-        clause = ",".join(results)
-        return f"({clause})"
+        if mode == "pad" and len(values) > 0:
+            # pad values to the next power of two by repeating the last value
+            # to keep the number of distinct queries small
+            values = list(values)
+            values.extend(
+                [values[-1]] * ((1 << (len(values) - 1).bit_length()) - len(values))
+            )
+
+        clause = self._bind_many("where_in", values)
+        # mark the clause as safe not to bind it again when the filter is called with arguments
+        return Markup(f"({clause})")
+
+    async def _bind_async(
+        self, context: Context, value: Any, key: str, lookup: Optional[str] = None
+    ) -> Union[Markup, str]:
+        if inspect.isawaitable(value):
+            value = await value
+
+        return self._bind(context, value, key, lookup)
+
+    async def _where_in_async(self, values: Any, **kwargs: Any) -> Markup:
+        if inspect.isawaitable(values):
+            values = await values
+
+        if isinstance(values, AsyncIterable):
+            values = [v async for v in values]
+
+        return self._where_in(values, **kwargs)
 
     def set_context(self, **kwargs: Any) -> None:
         """Set Jinja2 context"""
         self._context.update(kwargs)
 
-    @contextmanager
-    def _new_bind(self) -> Generator[None, None, None]:
-        self._param_index = 0
-        self._bind_params = OrderedDict()
+    def _is_template_name(self, query: str) -> bool:
+        return (
+            self._env.loader is not None
+            and TEMPLATE_NAME_PATTERN.fullmatch(query) is not None
+        )
+
+    def _load_template(self, env: Environment, query: str) -> Optional[Template]:
+        if not self._is_template_name(query):
+            return None
+
+        try:
+            return env.get_template(query)
+        except TemplateNotFound as e:
+            # a query without whitespace (e.g. "COMMIT") rather than a template name.
+            # a template included by the named template is not found otherwise.
+            if e.name != query:
+                raise
+
+            return None
+
+    def _get_template(self, query: str) -> Template:
+        template = self._load_template(self._env, query)
+        if template is not None:
+            return template
+
+        return self._from_string(query)
+
+    def _get_fingerprint(self, template: Template) -> str:
+        try:
+            return self._fingerprints[template]
+        except KeyError:
+            pass
+
+        # computed lazily as it is needed only for instrumentation and fingerprinted queries
+        source = self._sources.get(template)
+        if source is None:
+            loader = template.environment.loader
+            if template.name is not None and loader is not None:
+                # a named template. the source (not the name) so that a reloaded template gets a new fingerprint
+                source = loader.get_source(template.environment, template.name)[0]
+            else:
+                # a template object given by a user
+                source = f"<template {id(template)}>"
+
+        value = fingerprint(source)
+        self._fingerprints[template] = value
+        return value
+
+    def _from_string(self, source: str) -> Template:
+        template = self._template_cache.get(source)
+        if template is None:
+            template = self._compile_source(self._env, source)
+            self._template_cache.set(source, template)
+            self._sources[template] = source
+
+        return template
+
+    def _compile_source(self, env: Environment, source: str) -> Template:
+        if env.bytecode_cache is None:
+            return env.from_string(source)
+
+        # the same as what Jinja2 loaders do with a bytecode cache
+        name = sha1(source.encode()).hexdigest()
+        bucket = env.bytecode_cache.get_bucket(env, name, None, source)
+        code = bucket.code
+        if code is None:
+            code = env.compile(source)
+            bucket.code = code
+            env.bytecode_cache.set_bucket(bucket)
+
+        return env.template_class.from_code(env, code, env.make_globals(None), None)
+
+    def _get_async_env(self) -> Environment:
+        if self._async_env is None:
+            env = self._env.overlay()
+            env.is_async = True
+            # filters are shared with the original environment unless they are copied
+            env.filters = dict(self._env.filters)
+            env.filters["bind"] = context_filter(self._bind_async)
+            env.filters["where_in"] = unfoldable(self._where_in_async)
+            if self._bytecode_cache_dir is not None:
+                env.bytecode_cache = self._build_bytecode_cache(env)
+
+            self._async_env = env
+
+        return self._async_env
+
+    def _get_async_template(self, query: str) -> Template:
+        env = self._get_async_env()
+        template = self._load_template(env, query)
+        if template is not None:
+            return template
+
+        key = ("async", query)
+        template = self._template_cache.get(key)
+        if template is None:
+            template = self._compile_source(env, query)
+            self._template_cache.set(key, template)
+            self._sources[template] = query
 
-        yield
+        return template
+
+    def warmup(self, queries: Iterable[str]) -> None:
+        """Precompile query templates into the cache (and the bytecode cache if it is enabled)
+
+        Args:
+            queries (Iterable[str]): Query strings or template names
+        """
+        for query in queries:
+            self._get_template(query)
+
+    def cache_info(self) -> CacheInfo:
+        """Get the compiled template cache statistics
+
+        Returns:
+            CacheInfo: Cache statistics
+        """
+        return self._template_cache.info()
+
+    def clear_cache(self) -> None:
+        """Clear the compiled template cache"""
+        self._template_cache.clear()
+
+    def result_cache_info(self) -> CacheInfo:
+        """Get the prepared query cache statistics
+
+        Returns:
+            CacheInfo: Cache statistics
+        """
+        return self._result_cache.info()
+
+    def clear_result_cache(self) -> None:
+        """Clear the prepared query cache"""
+        self._result_cache.clear()
+
+    def _new_state(self) -> BindState:
+        state = BindState(named=self._param_style in NAMED_PARAM_STYLES)
+        if self._dedupe_params:
+            state.placeholders = {}
+
+        return state
+
+    @contextmanager
+    def _new_bind(self) -> Generator[BindState, None, None]:
+        state = self._new_state()
+        token = _bind_state.set(state)
+        try:
+            yield state
+        finally:
+            _bind_state.reset(token)
 
     def prepare_query(
         self, query: Union[str, Template], **kwargs: Any
@@ -145,24 +710,650 @@ class JinjaTemplateProcessor:
         """Prepare a query template
 
         Args:
-            query (Union[str, Template]): A query string/template
+            query (Union[str, Template]): A query string/template or a template name
 
         Returns:
             query (str): A prepared query
             bind_params (Union[List[Any], Dict[str, Any]]): Bind params
         """
-        template: Template = (
-            query if isinstance(query, Template) else self._env.from_string(query)
-        )
+        if self._result_cache_size > 0:
+            return self._prepare_cached(query, kwargs)
+
+        if self._on_render is not None:
+            start = perf_counter()
+            template = (
+                query if isinstance(query, Template) else self._get_template(query)
+            )
+            kwargs.update(self._context)
+            return self._render_instrumented(
+                template, kwargs, compile_time=perf_counter() - start
+            )
+
+        template = query if isinstance(query, Template) else self._get_template(query)
         return self._prepare_query(template, **kwargs)
 
+    def compile(self, query: Union[str, Template]) -> QueryPlan:
+        """Compile a query template into a query plan
+
+        If the SQL shape of the template does not depend on control flow or filters,
+        the plan renders the query only once and later calls only look up bind param values.
+
+        Args:
+            query (Union[str, Template]): A query string/template or a template name
+
+        Returns:
+            QueryPlan: A query plan
+        """
+        if isinstance(query, Template):
+            return QueryPlan(
+                self, query, dynamic_reason="template source is not available"
+            )
+
+        template = self._get_template(query)
+        segments, reason = find_static_segments(self._parse(self._get_source(query)))
+        if segments is None:
+            return QueryPlan(self, template, dynamic_reason=reason)
+
+        placeholder = PARAM_STYLE_TO_PLACEHOLDER[self._param_style]
+        parts: list[str] = []
+        sites: list[BindSite] = []
+        keys: list[str] = []
+        # the same lookups resolve to the same value objects
+        placeholders: dict[tuple[str, str, tuple[tuple[str, Any], ...]], str] = {}
+        for segment in segments:
+            if isinstance(segment, str):
+                parts.append(segment)
+                continue
+
+            lookup = (segment.key, segment.name or "", segment.path)
+            if lookup in placeholders:
+                parts.append(placeholders[lookup])
+                continue
+
+            index = len(sites) + 1
+            key = f"{segment.key}_{index}"
+            parts.append(str(escape(placeholder(key, index))))
+            sites.append(segment)
+            keys.append(key)
+            if self._dedupe_params and segment.name is not None:
+                placeholders[lookup] = parts[-1]
+
+        return QueryPlan(self, template, query="".join(parts), sites=sites, keys=keys)
+
+    def prepare_many(
+        self,
+        query: Union[str, Template],
+        rows: Iterable[Mapping[str, Any]],
+        *,
+        batch_size: int = 1000,
+    ) -> Iterator[tuple[str, list[Union[list[Any], dict[str, Any]]]]]:
+        """Prepare a query template for each row, suitable for `executemany`
+
+        Rows are consumed lazily. Consecutive rows rendering the same query are grouped into a batch.
+        A batch is yielded when it reaches the batch size or when the query changes.
+
+        Args:
+            query (Union[str, Template]): A query string/template or a template name
+            rows (Iterable[Mapping[str, Any]]): Rows (contexts)
+            batch_size (int, optional): Max number of rows (bind param sets) in a batch. Defaults to 1000.
+
+        Yields:
+            query (str): A prepared query
+            bind_params_list (List[Union[List[Any], Dict[str, Any]]]): Bind params of the rows
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be greater than 0")
+
+        plan = self.compile(query)
+
+        current: str = ""
+        batch: list[Union[list[Any], dict[str, Any]]] = []
+        for row in rows:
+            prepared, bind_params = plan.prepare_query(**row)
+            if batch and (prepared != current or len(batch) >= batch_size):
+                yield current, batch
+                batch = []
+
+            current = prepared
+            batch.append(bind_params)
+
+        if batch:
+            yield current, batch
+
+    def stream_query(
+        self,
+        query: Union[str, Template],
+        *,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        **kwargs: Any,
+    ) -> QueryStream:
+        """Prepare a query template lazily in chunks
+
+        The template is rendered only as far as the chunks are consumed, so memory is bounded by the chunk size
+        rather than the whole query. Bind params are available once the stream is exhausted.
+
+        Args:
+            query (Union[str, Template]): A query string/template or a template name
+            chunk_size (int, optional): Min number of characters in a chunk (except the last one). Defaults to 65536.
+
+        Returns:
+            QueryStream: A stream of query chunks
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be greater than 0")
+
+        start = perf_counter()
+        template = query if isinstance(query, Template) else self._get_template(query)
+        compiled = perf_counter()
+        kwargs.update(self._context)
+        context = self._validator.validate(kwargs)
+        validated = perf_counter()
+
+        state = self._new_state()
+        if self._on_render is not None:
+            state.where_in_sizes = []
+
+        chunks = self._generate(
+            template,
+            context,
+            state,
+            chunk_size,
+            compile_time=compiled - start,
+            validation_time=validated - compiled,
+        )
+        return QueryStream(chunks, state)
+
+    def write_query(
+        self,
+        query: Union[str, Template],
+        fp: Writable,
+        *,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        **kwargs: Any,
+    ) -> Union[list[Any], dict[str, Any]]:
+        """Prepare a query template and write it to a file-like object in chunks
+
+        Args:
+            query (Union[str, Template]): A query string/template or a template name
+            fp (Writable): File-like object (e.g. a file, `io.StringIO` or `socket.makefile("w")`)
+            chunk_size (int, optional): Min number of characters in a chunk (except the last one). Defaults to 65536.
+
+        Returns:
+            Union[list[Any], dict[str, Any]]: Bind params
+        """
+        return self.stream_query(query, chunk_size=chunk_size, **kwargs).write_to(fp)
+
+    def _generate(
+        self,
+        template: Template,
+        context: dict[str, Any],
+        state: BindState,
+        chunk_size: int,
+        *,
+        compile_time: float,
+        validation_time: float,
+    ) -> Iterator[str]:
+        fragments = template.generate(context)
+        buffer: list[str] = []
+        size = 0
+        sql_length = 0
+        render_time = 0.0
+
+        while True:
+            start = perf_counter()
+            # the bind state is set only while rendering because the consumer may
+            # iterate the stream in another context (e.g. another asyncio task)
+            token = _bind_state.set(state)
+            try:
+                fragment = next(fragments, None)
+            finally:
+                _bind_state.reset(token)
+            render_time += perf_counter() - start
+
+            if fragment is None:
+                break
+
+            buffer.append(fragment)
+            size += len(fragment)
+            if size >= chunk_size:
+                yield "".join(buffer)
+                sql_length += size
+                buffer.clear()
+                size = 0
+
+        if buffer:
+            yield "".join(buffer)
+            sql_length += size
+
+        self._check_params(state.params)
+
+        self._emit(
+            template,
+            state,
+            sql_length=sql_length,
+            compile_time=compile_time,
+            validation_time=validation_time,
+            render_time=render_time,
+        )
+
+    def analyze(self, query: str) -> TemplateAnalysis:
+        """Analyze a query template without rendering it
+
+        Analyses are cached per template source.
+
+        Args:
+            query (str): A query string or a template name
+
+        Returns:
+            TemplateAnalysis: Variables, bind params and filters used by the template and whether its SQL shape is static
+        """
+        source = self._get_source(query)
+        analysis = self._analyses.get(source)
+        if analysis is None:
+            analysis = analyze_template(self._parse(source), ignore=self._env.globals)
+            self._analyses.set(source, analysis)
+
+        return analysis
+
+    def _get_source(self, query: str) -> str:
+        if self._is_template_name(query) and self._env.loader is not None:
+            try:
+                return self._env.loader.get_source(self._env, query)[0]
+            except TemplateNotFound:
+                pass
+
+        return query
+
+    def _parse(self, source: str) -> nodes.Template:
+        node = self._env.parse(source)
+        if self._settings["rewrite_mode"] == "ast":
+            node = BindTransformer(pop_param_names(self._env)).visit(node)
+
+        return node
+
+    def _prepare_plan(
+        self, plan: QueryPlan, **kwargs: Any
+    ) -> tuple[str, Union[list[Any], dict[str, Any]]]:
+        if plan.query is None:
+            return self._prepare_query(plan.template, **kwargs)
+
+        start = perf_counter()
+        kwargs.update(self._context)
+        context = self._validator.validate(kwargs)
+        validated = perf_counter()
+
+        values = plan.resolve(self._env, context)
+        if values is None:
+            # e.g. undefined or SQL safe values change the SQL shape
+            return self._prepare_query(plan.template, **context)
+
+        bind_params: Union[list[Any], dict[str, Any]] = (
+            dict(zip(plan.keys, values))
+            if self._param_style in NAMED_PARAM_STYLES
+            else values
+        )
+        self._check_params(bind_params)
+
+        if self._on_render is not None:
+            self._on_render(
+                RenderEvent(
+                    fingerprint=self._get_fingerprint(plan.template),
+                    compile_time=0.0,
+                    validation_time=validated - start,
+                    render_time=perf_counter() - validated,
+                    bind_count=len(values),
+                    where_in_sizes=(),
+                    sql_length=len(plan.query),
+                )
+            )
+
+        return plan.query, bind_params
+
+    async def prepare_query_async(
+        self, query: Union[str, Template], **kwargs: Any
+    ) -> tuple[str, Union[list[Any], dict[str, Any]]]:
+        """Prepare a query template asynchronously
+
+        Awaitable values and async iterables in the context are resolved before rendering.
+
+        Args:
+            query (Union[str, Template]): A query string/template or a template name
+
+        Returns:
+            query (str): A prepared query
+            bind_params (Union[List[Any], Dict[str, Any]]): Bind params
+        """
+        kwargs.update(self._context)
+        context = await resolve_async_values(kwargs)
+
+        if self._should_offload(context) or (
+            isinstance(query, Template) and not query.environment.is_async
+        ):
+            template = (
+                query if isinstance(query, Template) else self._get_template(query)
+            )
+            import asyncio
+
+            # asyncio.to_thread copies the current context (contextvars) to the thread
+            return await asyncio.to_thread(self._prepare_query, template, **context)
+
+        start = perf_counter()
+        template = (
+            query if isinstance(query, Template) else self._get_async_template(query)
+        )
+        compiled = perf_counter()
+        context = self._validator.validate(context)
+        validated = perf_counter()
+
+        with self._new_bind() as state:
+            if self._on_render is not None:
+                state.where_in_sizes = []
+
+            prepared = await template.render_async(context)
+
+        self._emit(
+            template,
+            state,
+            sql_length=len(prepared),
+            compile_time=compiled - start,
+            validation_time=validated - compiled,
+            render_time=perf_counter() - validated,
+        )
+        return prepared, self._check_params(state.params)
+
+    def prepare_query_with_fingerprint(
+        self, query: Union[str, Template], **kwargs: Any
+    ) -> FingerprintedQuery:
+        """Prepare a query template with the fingerprint of its SQL shape and its normalized form
+
+        If the SQL shape of the template is static (see `compile`), the fingerprint is the one of the template
+        and the query is not rendered nor hashed. Otherwise the prepared query is hashed.
+        Normalized queries are cached per fingerprint.
+
+        Args:
+            query (Union[str, Template]): A query string/template or a template name
+
+        Returns:
+            FingerprintedQuery: A prepared query, its bind params, its fingerprint and its normalized form
+        """
+        static = False
+        if isinstance(query, Template):
+            template = query
+            prepared, bind_params = self.prepare_query(template, **kwargs)
+        else:
+            template = self._get_template(query)
+            plan = self._plans.get(query)
+            # compile again if the template is recompiled (e.g. reloaded)
+            if plan is None or plan.template is not template:
+                plan = self.compile(query)
+                self._plans.set(query, plan)
+
+            prepared, bind_params = plan.prepare_query(**kwargs)
+            # a plan falls back to full rendering for undefined or SQL safe values,
+            # which may change the SQL shape
+            static = plan.query is not None and prepared == plan.query
+
+        template_fingerprint = self._get_fingerprint(template)
+        # otherwise the SQL shape depends on the context (e.g. control flow and where_in)
+        key = (
+            template_fingerprint
+            if static
+            else fingerprint_query(template_fingerprint, prepared)
+        )
+
+        normalized = self._normalized.get(key)
+        if normalized is None:
+            normalized = normalize_query(prepared)
+            self._normalized.set(key, normalized)
+
+        return FingerprintedQuery(
+            query=prepared,
+            bind_params=bind_params,
+            fingerprint=key,
+            normalized=normalized,
+        )
+
+    def prepare_query_chunks(
+        self, query: Union[str, Template], **kwargs: Any
+    ) -> list[tuple[str, Union[list[Any], dict[str, Any]]]]:
+        """Prepare a query template, splitting it into multiple queries if it exceeds `max_params`
+
+        The values of the largest `where_in` call are split into chunks so that each query has at most
+        `max_params` bind params. Run all the queries and concatenate their results.
+        This is only correct for a plain `col IN (...)` filter. The results are wrong for `NOT IN`,
+        aggregates, `ORDER BY`/`LIMIT` and `DISTINCT` across the chunks.
+
+        Args:
+            query (Union[str, Template]): A query string/template or a template name
+
+        Raises:
+            MinisetTemplateException: If the query cannot be split into queries within `max_params`
+
+        Returns:
+            list[tuple[str, Union[list[Any], dict[str, Any]]]]: Prepared queries and their bind params
+        """
+        template = query if isinstance(query, Template) else self._get_template(query)
+        kwargs.update(self._context)
+        context = self._validator.validate(kwargs)
+
+        with self._new_bind() as state:
+            state.where_in_calls = []
+            prepared = template.render(context)
+
+        if self._max_params is None or len(state.params) <= self._max_params:
+            return [(prepared, state.params)]
+
+        calls = state.where_in_calls or []
+        budget = 0
+        if calls:
+            index = max(range(len(calls)), key=lambda i: calls[i][1])
+            size, bound, mode = calls[index]
+            if mode != "array":
+                # the other bind params are repeated in every chunk
+                budget = self._max_params - (len(state.params) - bound)
+
+        if budget < 1:
+            raise MinisetTemplateException(
+                f"Query has {len(state.params)} bind params exceeding max_params ({self._max_params}) "
+                "and cannot be split by where_in values"
+            )
+
+        # padded values must not exceed the budget either
+        step = budget if mode != "pad" else 1 << (budget.bit_length() - 1)
+
+        chunks: list[tuple[str, Union[list[Any], dict[str, Any]]]] = []
+        for start in range(0, size, step):
+            with self._new_bind() as state:
+                state.where_in_calls = []
+                state.where_in_slice = (index, slice(start, start + step))
+                prepared = template.render(context)
+
+            chunks.append((prepared, self._check_params(state.params)))
+
+        return chunks
+
+    def _check_params(
+        self, params: Union[list[Any], dict[str, Any]]
+    ) -> Union[list[Any], dict[str, Any]]:
+        if self._max_params is not None and len(params) > self._max_params:
+            raise MinisetTemplateException(
+                f"Query has {len(params)} bind params exceeding max_params ({self._max_params}). "
+                "Use prepare_query_chunks to split it into multiple queries"
+            )
+
+        return params
+
+    def _prepare_cached(
+        self, query: Union[str, Template], kwargs: dict[str, Any]
+    ) -> tuple[str, Union[list[Any], dict[str, Any]]]:
+        template: Optional[Template] = None
+        source = ""
+        template_key: Hashable
+        if isinstance(query, Template):
+            template = template_key = query
+        else:
+            template = self._load_template(self._env, query)
+            # a named template is keyed by the fingerprint of its source not to return a stale query after it is reloaded.
+            # a query string is keyed by itself, so that it is not compiled on a hit.
+            source = query
+            template_key = (
+                ("source", source)
+                if template is None
+                else ("name", self._get_fingerprint(template))
+            )
+
+        kwargs.update(self._context)
+        try:
+            key = (template_key, freeze(sorted(kwargs.items())))
+        except (TypeError, ValueError):
+            # the context has an unhashable value (ValueError for a writable memoryview)
+            return self._prepare_query(template or self._from_string(source), **kwargs)
+
+        result = self._result_cache.get(key)
+        if result is None:
+            prepared, params = self._prepare_query(
+                template or self._from_string(source), **kwargs
+            )
+            values = params.values() if isinstance(params, dict) else params
+            result = (
+                prepared,
+                params,
+                any(type(value) in MUTABLE_PARAM_TYPES for value in values),
+            )
+            self._result_cache.set(key, result)
+
+        # return a copy of the bind params not to change the cached ones.
+        # values such as lists bound by where_in array mode are copied as well.
+        prepared, params, mutable = result
+        return prepared, deepcopy(params) if mutable else params.copy()
+
+    def prepare_bundle(
+        self,
+        query: Union[str, Template],
+        *,
+        names: Optional[Iterable[str]] = None,
+        **kwargs: Any,
+    ) -> dict[str, tuple[str, Union[list[Any], dict[str, Any]]]]:
+        """Prepare the named statements of a query template in a single pass
+
+        Statements are declared by `{% query "name" %}...{% endquery %}` blocks.
+        The context is validated only once and each statement has its own bind params.
+
+        Args:
+            query (Union[str, Template]): A query string/template or a template name
+            names (Optional[Iterable[str]], optional): Names of statements to prepare. The others are skipped without rendering. Defaults to None (all).
+
+        Raises:
+            TypeError: If `names` is a str (not an iterable of names)
+            MinisetTemplateException: If statement names are duplicated
+
+        Returns:
+            dict[str, tuple[str, Union[list[Any], dict[str, Any]]]]: Prepared statements (stripped) and their bind params by name, in template order
+        """
+        if isinstance(names, str):
+            # a str is an iterable of characters
+            raise TypeError(f"names must be an iterable of names, not a str: {names!r}")
+
+        template = query if isinstance(query, Template) else self._get_template(query)
+        kwargs.update(self._context)
+        context = self._validator.validate(kwargs)
+
+        bundle = BundleState(names)
+        token = _bundle_state.set(bundle)
+        try:
+            # output outside of the statements is discarded
+            with self._new_bind():
+                template.render(context)
+        finally:
+            _bundle_state.reset(token)
+
+        return bundle.statements
+
+    def _render_statement(self, name: str, caller: Callable[[], str]) -> str:
+        bundle = _bundle_state.get(None)
+        if bundle is None:
+            # a statement is rendered in place unless it is in a bundle
+            return caller()
+
+        if bundle.names is not None and name not in bundle.names:
+            return ""
+
+        if name in bundle.statements:
+            raise MinisetTemplateException(f"Duplicate query name: {name}")
+
+        # each statement numbers its bind params independently
+        with self._new_bind() as state:
+            query = str(caller()).strip()
+
+        bundle.statements[name] = (query, self._check_params(state.params))
+        return ""
+
+    def _should_offload(self, context: dict[str, Any]) -> bool:
+        if self._offload_threshold is None:
+            return False
+
+        size = sum(
+            len(value)
+            for value in context.values()
+            if isinstance(value, (list, tuple, set, frozenset, dict))
+        )
+        return size >= self._offload_threshold
+
     def _prepare_query(
         self, template: Template, **kwargs: Any
     ) -> tuple[str, Union[list[Any], dict[str, Any]]]:
         kwargs.update(self._context)
-        context = validate_context_types(kwargs)
+        if self._on_render is not None:
+            return self._render_instrumented(template, kwargs)
+
+        context = self._validator.validate(kwargs)
+
+        with self._new_bind() as state:
+            query = template.render(context)
+            return query, self._check_params(state.params)
+
+    def _render_instrumented(
+        self, template: Template, context: dict[str, Any], *, compile_time: float = 0.0
+    ) -> tuple[str, Union[list[Any], dict[str, Any]]]:
+        start = perf_counter()
+        context = self._validator.validate(context)
+        validated = perf_counter()
 
-        cast = PARAM_STYLE_TO_CAST[self._param_style]
-        with self._new_bind():
+        with self._new_bind() as state:
+            state.where_in_sizes = []
             query = template.render(context)
-            return query, cast(self._bind_params)
+
+        self._emit(
+            template,
+            state,
+            sql_length=len(query),
+            compile_time=compile_time,
+            validation_time=validated - start,
+            render_time=perf_counter() - validated,
+        )
+        return query, self._check_params(state.params)
+
+    def _emit(
+        self,
+        template: Template,
+        state: BindState,
+        *,
+        sql_length: int,
+        compile_time: float,
+        validation_time: float,
+        render_time: float,
+    ) -> None:
+        if self._on_render is None:
+            return
+
+        self._on_render(
+            RenderEvent(
+                fingerprint=self._get_fingerprint(template),
+                compile_time=compile_time,
+                validation_time=validation_time,
+                render_time=render_time,
+                bind_count=len(state.params),
+                where_in_sizes=tuple(state.where_in_sizes or ()),
+                sql_length=sql_length,
+            )
+        )
@@ -0,0 +1,86 @@
+import os
+from collections import deque
+from collections.abc import Iterable, Iterator, Mapping
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Optional, Union
+
+from .jinja_context import JinjaTemplateProcessor
+from .plan import QueryPlan
+
+PreparedQuery = tuple[str, Union[list[Any], dict[str, Any]]]
+
+# a query plan compiled once per worker process
+_worker_plan: Optional[QueryPlan] = None
+
+
+def _init_worker(query: str, options: dict[str, Any]) -> None:
+    global _worker_plan
+
+    _worker_plan = JinjaTemplateProcessor(**options).compile(query)
+
+
+def _render_batch(contexts: list[dict[str, Any]]) -> list[PreparedQuery]:
+    if _worker_plan is None:  # pragma: no cover
+        raise RuntimeError("worker is not initialized")
+
+    return [_worker_plan.prepare_query(**context) for context in contexts]
+
+
+def render_parallel(
+    query: str,
+    contexts: Iterable[Mapping[str, Any]],
+    *,
+    workers: Optional[int] = None,
+    batch_size: int = 1000,
+    max_pending: Optional[int] = None,
+    **options: Any,
+) -> Iterator[PreparedQuery]:
+    """Prepare a query template for each context in worker processes
+
+    The template source and the processor options are sent to each worker only once,
+    and each worker keeps the compiled template. Contexts are consumed lazily and sent in batches.
+    Results are yielded in the order of the contexts.
+
+    Args:
+        query (str): A query string or a template name (if `loader` is given)
+        contexts (Iterable[Mapping[str, Any]]): Contexts (picklable)
+        workers (Optional[int], optional): Number of worker processes. Defaults to None (the number of CPUs).
+        batch_size (int, optional): Number of contexts to send to a worker at a time. Defaults to 1000.
+        max_pending (Optional[int], optional): Max number of batches in flight. Defaults to None (twice the number of workers).
+        **options: Options of JinjaTemplateProcessor (picklable, e.g. param_style, identifier_quote_character)
+
+    Yields:
+        query (str): A prepared query
+        bind_params (Union[List[Any], Dict[str, Any]]): Bind params
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be greater than 0")
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 2
+    if max_pending < 1:
+        raise ValueError("max_pending must be greater than 0")
+
+    rows = iter(contexts)
+    pending: deque[Future[list[PreparedQuery]]] = deque()
+
+    executor = ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(query, options)
+    )
+    try:
+        while True:
+            # keep the number of batches in flight bounded not to hold all the results in memory
+            while len(pending) < max_pending:
+                batch = [dict(context) for context in islice(rows, batch_size)]
+                if not batch:
+                    break
+
+                pending.append(executor.submit(_render_batch, batch))
+
+            if not pending:
+                break
+
+            yield from pending.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
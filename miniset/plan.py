@@ -0,0 +1,179 @@
+from typing import TYPE_CHECKING, Any, NamedTuple, Optional, Union
+
+from jinja2 import Environment, Template, Undefined, nodes
+from markupsafe import Markup
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .jinja_context import JinjaTemplateProcessor
+
+
+class BindSite(NamedTuple):
+    """A `{{ ... | bind(key) }}` site whose value is a plain lookup"""
+
+    key: str
+    name: Optional[str]
+    path: tuple[tuple[str, Any], ...] = ()
+    const: Any = None
+
+    def resolve(self, env: Environment, context: dict[str, Any]) -> Any:
+        """Resolve the value of the site in the same way as Jinja2 does
+
+        Args:
+            env (Environment): Jinja2 environment
+            context (dict[str, Any]): Context
+
+        Returns:
+            Any: Value. Undefined if the value cannot be resolved.
+        """
+        if self.name is None:
+            return self.const
+
+        if self.name not in context:
+            return env.undefined(name=self.name)
+
+        value = context[self.name]
+        for kind, arg in self.path:
+            if kind == "attr":
+                value = env.getattr(value, arg)
+            else:
+                value = env.getitem(value, arg)
+
+        return value
+
+
+Segment = Union[str, BindSite]
+
+
+def _to_bind_site(node: nodes.Filter) -> Optional[BindSite]:
+    if (
+        node.name != "bind"
+        or len(node.args) != 1
+        or not isinstance(node.args[0], nodes.Const)
+        or node.kwargs
+        or node.dyn_args is not None
+        or node.dyn_kwargs is not None
+    ):
+        return None
+
+    key = node.args[0].value
+    expr = node.node
+
+    if isinstance(expr, nodes.Const):
+        return BindSite(key=key, name=None, const=expr.value)
+
+    path: list[tuple[str, Any]] = []
+    while True:
+        if isinstance(expr, nodes.Getattr):
+            path.append(("attr", expr.attr))
+        elif isinstance(expr, nodes.Getitem) and isinstance(expr.arg, nodes.Const):
+            path.append(("item", expr.arg.value))
+        else:
+            break
+
+        expr = expr.node
+
+    if not isinstance(expr, nodes.Name):
+        return None
+
+    return BindSite(key=key, name=expr.name, path=tuple(reversed(path)))
+
+
+def find_static_segments(
+    node: nodes.Template,
+) -> tuple[Optional[list[Segment]], Optional[str]]:
+    """Split a (SqlExtension rewritten) template into literal SQL and bind sites if the SQL shape is static
+
+    The SQL shape is static if the template consists of literal SQL and bind params of plain lookups only.
+    Control flow (`if`, `for`, macros, etc.), `where_in`, `sql_safe` and `identifier` make the shape dynamic.
+
+    Args:
+        node (nodes.Template): Template node
+
+    Returns:
+        Optional[list[Segment]]: Segments. None if the SQL shape is dynamic.
+        Optional[str]: A reason why the SQL shape is dynamic.
+    """
+    segments: list[Segment] = []
+
+    for child in node.body:
+        if not isinstance(child, nodes.Output):
+            return None, f"{type(child).__name__} node"
+
+        for item in child.nodes:
+            if isinstance(item, nodes.TemplateData):
+                segments.append(item.data)
+                continue
+
+            site = _to_bind_site(item) if isinstance(item, nodes.Filter) else None
+            if site is None:
+                if isinstance(item, nodes.Filter):
+                    return None, f"{item.name} filter"
+
+                return None, f"{type(item).__name__} node"
+
+            segments.append(site)
+
+    return segments, None
+
+
+class QueryPlan:
+    """A compiled query template.
+
+    If the SQL shape of the template is static, the query is rendered only once and
+    subsequent calls only look up bind param values from the context.
+    Otherwise it falls back to full rendering.
+    """
+
+    def __init__(
+        self,
+        processor: "JinjaTemplateProcessor",
+        template: Template,
+        *,
+        query: Optional[str] = None,
+        sites: Optional[list[BindSite]] = None,
+        keys: Optional[list[str]] = None,
+        dynamic_reason: Optional[str] = None,
+    ) -> None:
+        self._processor = processor
+
+        self.template = template
+        self.query = query
+        self.sites: list[BindSite] = sites or []
+        self.keys: list[str] = keys or []
+        self.dynamic_reason = dynamic_reason
+
+    @property
+    def is_static(self) -> bool:
+        """Whether the SQL shape is static (the query is rendered only once) or not"""
+        return self.query is not None
+
+    def resolve(self, env: Environment, context: dict[str, Any]) -> Optional[list[Any]]:
+        """Resolve bind param values
+
+        Args:
+            env (Environment): Jinja2 environment
+            context (dict[str, Any]): Context
+
+        Returns:
+            Optional[list[Any]]: Values. None if any of them needs full rendering (undefined or SQL safe values).
+        """
+        values: list[Any] = []
+        for site in self.sites:
+            value = site.resolve(env, context)
+            if isinstance(value, (Undefined, Markup)):
+                return None
+
+            values.append(value)
+
+        return values
+
+    def prepare_query(
+        self, **kwargs: Any
+    ) -> tuple[str, Union[list[Any], dict[str, Any]]]:
+        """Prepare a query
+
+        Returns:
+            query (str): A prepared query
+            bind_params (Union[List[Any], Dict[str, Any]]): Bind params
+        """
+        return self._processor._prepare_plan(self, **kwargs)
@@ -0,0 +1,70 @@
+from collections.abc import Iterator
+from typing import TYPE_CHECKING, Any, Protocol, Union
+
+from .exceptions import MinisetTemplateException
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .jinja_context import BindState
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class Writable(Protocol):
+    """A file-like object to write a query to (e.g. a file, `io.StringIO` or `socket.makefile("w")`)"""
+
+    def write(self, s: str, /) -> Any: ...
+
+
+class QueryStream:
+    """A query rendered lazily in chunks.
+
+    Bind params are accumulated while the chunks are consumed and are available once the stream is exhausted.
+    """
+
+    def __init__(self, chunks: Iterator[str], state: "BindState") -> None:
+        self._chunks = chunks
+        self._state = state
+        self._exhausted = False
+
+    def __iter__(self) -> "QueryStream":
+        return self
+
+    def __next__(self) -> str:
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            self._exhausted = True
+            raise
+
+    @property
+    def exhausted(self) -> bool:
+        """Whether all the chunks have been consumed or not"""
+        return self._exhausted
+
+    @property
+    def params(self) -> Union[list[Any], dict[str, Any]]:
+        """Bind params
+
+        Raises:
+            MinisetTemplateException: If the stream is not exhausted yet
+        """
+        if not self._exhausted:
+            raise MinisetTemplateException(
+                "bind params are available only after the query stream is exhausted"
+            )
+
+        return self._state.params
+
+    def write_to(self, fp: Writable) -> Union[list[Any], dict[str, Any]]:
+        """Write the remaining chunks to a file-like object
+
+        Args:
+            fp (Writable): File-like object
+
+        Returns:
+            Union[list[Any], dict[str, Any]]: Bind params
+        """
+        for chunk in self:
+            fp.write(chunk)
+
+        return self.params
@@ -2,3 +2,5 @@ from typing import Literal
 
 ParamStyleType = Literal["qmark", "format", "numeric", "named", "pyformat", "asyncpg"]
 IdentifierQuoteCharacterType = Literal["`", '"']
+WhereInModeType = Literal["expand", "pad", "array"]
+RewriteModeType = Literal["stream", "ast"]
@@ -0,0 +1,163 @@
+from array import array
+from collections.abc import Iterable
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Literal, Optional
+from uuid import UUID
+
+from .exceptions import MinisetTemplateException
+
+ValueKindType = Literal["scalar", "sequence", "mapping"]
+
+DEFAULT_TYPES: dict[type, ValueKindType] = {
+    type(None): "scalar",
+    bool: "scalar",
+    str: "scalar",
+    int: "scalar",
+    float: "scalar",
+    datetime: "scalar",
+    date: "scalar",
+    time: "scalar",
+    timedelta: "scalar",
+    Decimal: "scalar",
+    UUID: "scalar",
+    # binary values are bound as they are (never copied)
+    bytes: "scalar",
+    bytearray: "scalar",
+    memoryview: "scalar",
+    # containers of numbers are regarded as scalars
+    range: "scalar",
+    array: "scalar",
+    list: "sequence",
+    tuple: "sequence",
+    set: "sequence",
+    frozenset: "sequence",
+    dict: "mapping",
+}
+
+
+def _is_numpy_array(value: Any) -> bool:
+    cls = type(value)
+    return cls.__module__ == "numpy" and cls.__name__ == "ndarray"
+
+
+class ContextValidator:
+    """Validator to check whether context values are safe to use in a template.
+
+    Values are checked by their exact types (subclasses are not allowed unless they are registered).
+    Nested lists, tuples, sets and dicts are validated recursively.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_depth: int = 32,
+        max_items: Optional[int] = None,
+        extra_types: Iterable[type] = (),
+        recursive: bool = True,
+    ) -> None:
+        """Initialize the validator.
+
+        Args:
+            max_depth (int, optional): Max depth of nested containers. Defaults to 32.
+            max_items (Optional[int], optional): Max number of values in a context. Defaults to None (unlimited).
+            extra_types (Iterable[type], optional): Extra scalar types to allow. Defaults to ().
+            recursive (bool, optional): Whether to validate nested values or top-level values only. Defaults to True.
+        """
+        self.max_depth = max_depth
+        self.max_items = max_items
+        self.recursive = recursive
+
+        self._kinds: dict[type, Optional[ValueKindType]] = dict(DEFAULT_TYPES)
+        self._scalar_types: set[type] = set()
+        for cls in extra_types:
+            self.register(cls)
+
+        self._update_scalar_types()
+
+    def _update_scalar_types(self) -> None:
+        self._scalar_types = {
+            cls for cls, kind in self._kinds.items() if kind == "scalar"
+        }
+
+    def register(self, cls: type, kind: ValueKindType = "scalar") -> None:
+        """Register a safe type
+
+        Args:
+            cls (type): Type
+            kind (ValueKindType, optional): Kind of the type. "sequence" and "mapping" are validated recursively. Defaults to "scalar".
+        """
+        self._kinds[cls] = kind
+        self._update_scalar_types()
+
+    def _kind_of(self, value: Any) -> Optional[ValueKindType]:
+        cls = type(value)
+        try:
+            return self._kinds[cls]
+        except KeyError:
+            pass
+
+        # cache the decision not to check the type again
+        kind: Optional[ValueKindType] = "scalar" if _is_numpy_array(value) else None
+        self._kinds[cls] = kind
+        if kind == "scalar":
+            self._update_scalar_types()
+
+        return kind
+
+    def validate(self, context: dict[str, Any]) -> dict[str, Any]:
+        """Validate a context
+
+        Args:
+            context (dict[str, Any]): Context
+
+        Raises:
+            MinisetTemplateException: If the context has an unsafe value
+
+        Returns:
+            dict[str, Any]: The context
+        """
+        budget = [self.max_items] if self.max_items is not None else None
+        for key, value in context.items():
+            self._validate(key, value, 0, budget)
+
+        return context
+
+    def _validate(
+        self, path: str, value: Any, depth: int, budget: Optional[list[int]]
+    ) -> None:
+        kind = self._kind_of(value)
+        if kind is None:
+            raise MinisetTemplateException(
+                f"Unsafe template value for key {path}: {type(value).__name__}"
+            )
+
+        if kind == "scalar" or not self.recursive:
+            return
+
+        if depth >= self.max_depth:
+            raise MinisetTemplateException(
+                f"Template value for key {path} is nested too deeply (max depth: {self.max_depth})"
+            )
+
+        if budget is not None:
+            budget[0] -= len(value)
+            if budget[0] < 0:
+                raise MinisetTemplateException(
+                    f"Template context has too many values (max items: {self.max_items})"
+                )
+
+        children = value.values() if kind == "mapping" else value
+        # fast path: a container of scalars only (e.g. a list for where_in)
+        if set(map(type, children)) <= self._scalar_types:
+            return
+
+        if kind == "mapping":
+            for child_key, child in value.items():
+                self._validate(f"{path}.{child_key}", child, depth + 1, budget)
+        else:
+            for index, child in enumerate(value):
+                self._validate(f"{path}[{index}]", child, depth + 1, budget)
+
+
+DEFAULT_VALIDATOR = ContextValidator()
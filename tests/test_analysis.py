@@ -0,0 +1,92 @@
+import asyncio
+from typing import get_args
+
+import pytest
+from jinja2 import DictLoader
+
+from miniset import JinjaTemplateProcessor
+from miniset.analysis import FilterSite
+from miniset.exceptions import MinisetTemplateException, MinisetUndefinedException
+from miniset.types import RewriteModeType
+
+TEMPLATE = """SELECT {{ column | identifier }}, {{ expr | sql_safe }} FROM t
+WHERE a = {{ request.a }} AND b IN {{ ids | where_in }}
+{% for x in xs %}AND c = {{ x }}{% endfor %}
+{% set limit = 10 %}LIMIT {{ limit }} OFFSET {{ range(3) | list | length }}"""
+
+
+@pytest.mark.parametrize("rewrite_mode", get_args(RewriteModeType))
+def test_analyze(rewrite_mode: RewriteModeType):
+    p = JinjaTemplateProcessor(rewrite_mode=rewrite_mode)
+    analysis = p.analyze(TEMPLATE)
+
+    # locals (x, limit) and globals (range) are not variables
+    assert analysis.variables == {"column", "expr", "request", "ids", "xs"}
+    assert analysis.bind_sites == (
+        FilterSite("request", 2),
+        FilterSite("x", 3),
+        FilterSite("limit", 4),
+        FilterSite("range", 4),
+    )
+    assert analysis.where_in_sites == (FilterSite("ids", 2),)
+    assert analysis.sql_safe_sites == (FilterSite("expr", 1),)
+    assert analysis.identifier_sites == (FilterSite("column", 1),)
+    assert analysis.is_static is False
+    assert analysis.dynamic_reason is not None
+
+    assert analysis.missing(["column", "expr", "request"]) == {"ids", "xs"}
+
+    # cached
+    assert p.analyze(TEMPLATE) is analysis
+
+
+def test_analyze_static():
+    p = JinjaTemplateProcessor()
+    analysis = p.analyze("SELECT * FROM t WHERE a = {{ a }} AND b = {{ b.c }}")
+    assert analysis.is_static
+    assert analysis.variables == {"a", "b"}
+    assert [site.name for site in analysis.bind_sites] == ["a", "b"]
+
+
+def test_analyze_template_name():
+    loader = DictLoader({"q.sql": "SELECT {{ a }}"})
+    p = JinjaTemplateProcessor(loader=loader)
+    assert p.analyze("q.sql").variables == {"a"}
+
+    loader.mapping["q.sql"] = "SELECT {{ b }}"
+    assert p.analyze("q.sql").variables == {"b"}
+
+
+@pytest.mark.parametrize(
+    "template,context",
+    [
+        ("SELECT {{ a }}", {}),
+        ("SELECT {{ a.b }}", {"a": {}}),
+        ("SELECT {{ a ~ 'x' }}", {}),
+        ("SELECT * FROM t WHERE id IN {{ ids | where_in }}", {}),
+        ("SELECT {% for x in xs %}{{ x }}{% endfor %}", {}),
+    ],
+)
+def test_strict(template: str, context: dict):
+    p = JinjaTemplateProcessor(strict=True)
+
+    with pytest.raises(MinisetUndefinedException):
+        p.prepare_query(template, **context)
+
+    with pytest.raises(MinisetUndefinedException):
+        p.compile(template).prepare_query(**context)
+
+    with pytest.raises(MinisetUndefinedException):
+        asyncio.run(p.prepare_query_async(template, **context))
+
+    # not strict
+    JinjaTemplateProcessor().prepare_query(template, **context)
+
+
+def test_strict_defined():
+    p = JinjaTemplateProcessor(strict=True)
+    assert p.prepare_query(
+        "SELECT {{ a | default(1) }}{% if b is defined %}, {{ b }}{% endif %}"
+    ) == ("SELECT %s", [1])
+
+    assert issubclass(MinisetUndefinedException, MinisetTemplateException)
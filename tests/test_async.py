@@ -0,0 +1,70 @@
+import asyncio
+from typing import Any, get_args
+
+import pytest
+
+from miniset import JinjaTemplateProcessor, ParamStyleType
+
+TEMPLATES = [
+    "SELECT * FROM t WHERE id = {{ id }} AND name = {{ name }}",
+    "SELECT * FROM t WHERE id IN {{ ids | where_in }} AND name = {{ name }}",
+    "SELECT * FROM t {% if name %}WHERE name = {{ name }}{% endif %} {% for id in ids %}OR id = {{ id }} {% endfor %}",
+    "{% macro eq(column, value) -%}{{ column | identifier }} = {{ value }}{%- endmacro %}SELECT * FROM t WHERE {{ eq('name', name) }}",
+]
+CONTEXT = {"id": 1, "name": "foo", "ids": [1, 2, 3]}
+
+
+@pytest.mark.parametrize("param_style", get_args(ParamStyleType))
+@pytest.mark.parametrize("template", TEMPLATES)
+def test_prepare_query_async(template: str, param_style: ParamStyleType):
+    p = JinjaTemplateProcessor(param_style=param_style)
+    expected = p.prepare_query(template, **CONTEXT)
+    assert asyncio.run(p.prepare_query_async(template, **CONTEXT)) == expected
+
+
+def test_prepare_query_async_with_async_values():
+    p = JinjaTemplateProcessor(param_style="asyncpg")
+
+    async def fetch_name() -> str:
+        await asyncio.sleep(0)
+        return "foo"
+
+    async def fetch_ids():
+        for i in range(3):
+            await asyncio.sleep(0)
+            yield i
+
+    query, bind_params = asyncio.run(
+        p.prepare_query_async(
+            "SELECT * FROM t WHERE name = {{ name }} AND id IN {{ ids | where_in }}",
+            name=fetch_name(),
+            ids=fetch_ids(),
+        )
+    )
+    assert query == "SELECT * FROM t WHERE name = $1 AND id IN ($2,$3,$4)"
+    assert bind_params == ["foo", 0, 1, 2]
+
+
+@pytest.mark.parametrize("offload_threshold", [None, 1])
+def test_prepare_query_async_concurrently(offload_threshold: Any):
+    p = JinjaTemplateProcessor(param_style="qmark", offload_threshold=offload_threshold)
+
+    async def task(i: int):
+        await asyncio.sleep(0)
+        return await p.prepare_query_async(TEMPLATES[1], ids=[i, i + 1], name=str(i))
+
+    async def main():
+        return await asyncio.gather(*(task(i) for i in range(2000)))
+
+    for i, (query, bind_params) in enumerate(asyncio.run(main())):
+        assert query == "SELECT * FROM t WHERE id IN (?,?) AND name = ?"
+        assert bind_params == [i, i + 1, str(i)]
+
+
+def test_prepare_query_async_with_sync_template():
+    p = JinjaTemplateProcessor()
+    template = p._env.from_string(TEMPLATES[0])
+    assert asyncio.run(p.prepare_query_async(template, **CONTEXT)) == (
+        "SELECT * FROM t WHERE id = %s AND name = %s",
+        [1, "foo"],
+    )
@@ -0,0 +1,66 @@
+import tracemalloc
+from typing import Any, get_args
+
+import pytest
+
+from miniset import JinjaTemplateProcessor, ParamStyleType
+
+PAYLOAD_SIZE = 100 * 1024 * 1024
+
+TEMPLATE = "INSERT INTO documents (id, body) VALUES ({{ id }}, {{ payload }})"
+
+
+@pytest.fixture(scope="module")
+def payload() -> bytes:
+    return b"x" * PAYLOAD_SIZE
+
+
+@pytest.mark.parametrize("param_style", get_args(ParamStyleType))
+@pytest.mark.parametrize("cls", [bytes, bytearray, memoryview])
+def test_bind_binary(param_style: ParamStyleType, cls: type):
+    p = JinjaTemplateProcessor(param_style=param_style)
+    value: Any = cls(b"\x00\xff")
+
+    _, params = p.prepare_query(TEMPLATE, id=1, payload=value)
+    values = list(params.values()) if isinstance(params, dict) else params
+    # bound as it is
+    assert values[1] is value
+
+
+@pytest.mark.parametrize(
+    "wrap",
+    [
+        lambda payload: payload,
+        bytearray,
+        memoryview,
+        lambda payload: payload.decode(),
+    ],
+)
+def test_bind_large_value_without_copying(payload: bytes, wrap: Any):
+    value = wrap(payload)
+    p = JinjaTemplateProcessor(param_style="named")
+    p.warmup([TEMPLATE])
+    plan = p.compile(TEMPLATE)
+
+    tracemalloc.start()
+    try:
+        _, params = p.prepare_query(TEMPLATE, id=1, payload=value)
+        plan.prepare_query(id=1, payload=value)
+        list(p.stream_query(TEMPLATE, id=1, payload=value))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert isinstance(params, dict)
+    assert params["payload_2"] is value
+    # far less than the payload (a single copy would be 100 MB)
+    assert peak < 1024 * 1024
+
+
+def test_result_cache_with_writable_memoryview():
+    p = JinjaTemplateProcessor(result_cache_size=2)
+    value = memoryview(bytearray(b"x"))
+
+    _, params = p.prepare_query("SELECT {{ value }}", value=value)
+    assert params[0] is value
+    assert p.result_cache_info().size == 0
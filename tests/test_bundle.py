@@ -0,0 +1,75 @@
+from typing import Any, get_args
+
+import pytest
+
+from miniset import JinjaTemplateProcessor, ParamStyleType
+from miniset.exceptions import MinisetTemplateException
+from miniset.types import RewriteModeType
+
+BUNDLE = """
+{% query "setup" %}
+CREATE TEMP TABLE ids AS SELECT id FROM projects WHERE owner = {{ owner }}
+{% endquery %}
+{% for table in tables %}
+{% query table %}
+SELECT * FROM {{ table | identifier }} WHERE id IN {{ ids | where_in }} AND owner = {{ owner }}
+{% endquery %}
+{% endfor %}
+"""
+
+
+@pytest.mark.parametrize("rewrite_mode", get_args(RewriteModeType))
+@pytest.mark.parametrize("param_style", get_args(ParamStyleType))
+def test_prepare_bundle(param_style: ParamStyleType, rewrite_mode: RewriteModeType):
+    p = JinjaTemplateProcessor(param_style=param_style, rewrite_mode=rewrite_mode)
+    context: dict[str, Any] = {"owner": "foo", "tables": ["a", "b"], "ids": [1, 2]}
+
+    bundle = p.prepare_bundle(BUNDLE, **context)
+    assert list(bundle) == ["setup", "a", "b"]
+
+    # each statement is the same as the one prepared separately
+    assert bundle["setup"] == p.prepare_query(
+        "CREATE TEMP TABLE ids AS SELECT id FROM projects WHERE owner = {{ owner }}",
+        **context,
+    )
+    for table in ["a", "b"]:
+        assert bundle[table] == p.prepare_query(
+            f'SELECT * FROM "{table}" WHERE id IN {{{{ ids | where_in }}}} AND owner = {{{{ owner }}}}',
+            **context,
+        )
+
+
+def test_prepare_bundle_with_names():
+    p = JinjaTemplateProcessor(param_style="qmark")
+    template = """
+    {% query "a" %}SELECT {{ id }}{% endquery %}
+    {% query "b" %}SELECT * FROM t WHERE id {{ ids | where_in(mode="array") }}{% endquery %}
+    """
+
+    # "b" raises if it is rendered
+    with pytest.raises(MinisetTemplateException):
+        p.prepare_bundle(template, id=1, ids=[1])
+
+    assert p.prepare_bundle(template, names=["a"], id=1, ids=[1]) == {
+        "a": ("SELECT ?", [1])
+    }
+
+    with pytest.raises(TypeError):
+        p.prepare_bundle(template, names="a", id=1, ids=[1])
+
+
+def test_prepare_bundle_duplicate_names():
+    p = JinjaTemplateProcessor()
+    with pytest.raises(MinisetTemplateException):
+        p.prepare_bundle(
+            "{% for i in [1, 2] %}{% query 'a' %}SELECT {{ i }}{% endquery %}{% endfor %}"
+        )
+
+
+def test_query_block_in_prepare_query():
+    p = JinjaTemplateProcessor(param_style="numeric")
+    assert p.prepare_query(
+        "{% query 'a' %}SELECT {{ a }};{% endquery %}{% query 'b' %}SELECT {{ b }};{% endquery %}",
+        a=1,
+        b=2,
+    ) == ("SELECT :1;SELECT :2;", [1, 2])
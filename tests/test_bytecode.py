@@ -0,0 +1,45 @@
+from pathlib import Path
+
+import pytest
+
+from miniset import JinjaTemplateProcessor
+
+TEMPLATES = [
+    "SELECT * FROM t WHERE id = {{ id }}",
+    "SELECT * FROM t WHERE id IN {{ ids | where_in }}",
+]
+
+
+def test_warmup(tmp_path: Path):
+    p = JinjaTemplateProcessor(bytecode_cache_dir=tmp_path)
+    p.warmup(TEMPLATES)
+    assert p.cache_info().size == 2
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_bytecode_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    JinjaTemplateProcessor(bytecode_cache_dir=tmp_path).warmup(TEMPLATES)
+
+    p = JinjaTemplateProcessor(bytecode_cache_dir=tmp_path)
+
+    def compile(*args, **kwargs):
+        raise AssertionError("should not be called")
+
+    monkeypatch.setattr(p._env, "compile", compile)
+
+    assert p.prepare_query(TEMPLATES[0], id=1) == (
+        "SELECT * FROM t WHERE id = %s",
+        [1],
+    )
+    assert p.prepare_query(TEMPLATES[1], ids=[1, 2]) == (
+        "SELECT * FROM t WHERE id IN (%s,%s)",
+        [1, 2],
+    )
+
+
+def test_bytecode_cache_with_different_settings(tmp_path: Path):
+    JinjaTemplateProcessor(bytecode_cache_dir=tmp_path).warmup(TEMPLATES)
+    JinjaTemplateProcessor(bytecode_cache_dir=tmp_path, param_style="qmark").warmup(
+        TEMPLATES
+    )
+    assert len(list(tmp_path.iterdir())) == 4
@@ -0,0 +1,55 @@
+import pytest
+
+from miniset.cache import LRUCache
+
+
+def test_lru_cache():
+    cache: LRUCache[int] = LRUCache(2)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    # "b" is the least recently used one
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("b") is None
+
+    info = cache.info()
+    assert info.hits == 1
+    assert info.misses == 1
+    assert info.evictions == 1
+    assert info.size == 2
+
+    cache.clear()
+    assert cache.info() == (0, 0, 0, 2, 0)
+
+
+def test_disabled_lru_cache():
+    cache: LRUCache[int] = LRUCache(0)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_lru_cache_ttl(monkeypatch: pytest.MonkeyPatch):
+    now = 0.0
+    monkeypatch.setattr("miniset.cache.monotonic", lambda: now)
+
+    cache: LRUCache[int] = LRUCache(2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    now = 5.0
+    assert cache.get("a") == 1
+
+    now = 10.0
+    assert cache.get("a") is None
+    assert cache.pop("b") is None
+    assert len(cache) == 0
+    assert cache.info() == (1, 2, 2, 2, 0)
+
+
+def test_invalid_lru_cache_ttl():
+    with pytest.raises(ValueError):
+        LRUCache(2, ttl=0)
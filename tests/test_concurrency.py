@@ -0,0 +1,48 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from miniset import JinjaTemplateProcessor
+
+TEMPLATE = "SELECT * FROM t WHERE id = {{ id }} AND name = {{ name }} AND tag IN {{ tags | where_in }}"
+EXPECTED_QUERY = "SELECT * FROM t WHERE id = ? AND name = ? AND tag IN (?,?,?)"
+
+
+def render(p: JinjaTemplateProcessor, i: int):
+    return p.prepare_query(TEMPLATE, id=i, name=f"name-{i}", tags=[i, i + 1, i + 2])
+
+
+def test_threads():
+    p = JinjaTemplateProcessor(param_style="qmark")
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(lambda i: render(p, i), range(5000)))
+
+    for i, (query, bind_params) in enumerate(results):
+        assert query == EXPECTED_QUERY
+        assert bind_params == [i, f"name-{i}", i, i + 1, i + 2]
+
+
+def test_asyncio_tasks():
+    p = JinjaTemplateProcessor(param_style="qmark")
+    template = p._get_template(TEMPLATE)
+
+    async def task(i: int):
+        # render step by step and yield to the event loop between the steps
+        # so that renders of the tasks interleave
+        with p._new_bind() as state:
+            chunks: list[str] = []
+            for chunk in template.generate(
+                id=i, name=f"name-{i}", tags=[i, i + 1, i + 2]
+            ):
+                chunks.append(chunk)
+                await asyncio.sleep(0)
+
+        return "".join(chunks), state.params
+
+    async def main():
+        return await asyncio.gather(*(task(i) for i in range(5000)))
+
+    results = asyncio.run(main())
+    for i, (query, bind_params) in enumerate(results):
+        assert query == EXPECTED_QUERY
+        assert bind_params == [i, f"name-{i}", i, i + 1, i + 2]
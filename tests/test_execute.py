@@ -0,0 +1,95 @@
+import gc
+import sqlite3
+from collections.abc import Generator
+
+import pytest
+
+from miniset.execute import (
+    StatementRunner,
+    execute,
+    executemany,
+    fetch_iter,
+    get_param_style,
+    get_runner,
+)
+
+
+@pytest.fixture
+def conn() -> Generator[sqlite3.Connection, None, None]:
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE hero (id INTEGER PRIMARY KEY, name TEXT)")
+    yield conn
+    conn.close()
+
+
+def test_get_param_style(conn: sqlite3.Connection):
+    assert get_param_style(conn) == "qmark"
+
+
+def test_execute(conn: sqlite3.Connection):
+    insert = "INSERT INTO hero (id, name) VALUES ({{ id }}, {{ name }})"
+    assert (
+        executemany(
+            conn,
+            insert,
+            ({"id": i, "name": f"hero-{i}"} for i in range(10)),
+            batch_size=3,
+        )
+        == 10
+    )
+
+    cursor = execute(conn, "SELECT name FROM hero WHERE id = {{ id }}", id=1)
+    assert cursor.fetchall() == [("hero-1",)]
+
+    rows = fetch_iter(
+        conn, "SELECT id FROM hero WHERE id IN {{ ids | where_in }}", ids=[1, 2, 3]
+    )
+    assert list(rows) == [(1,), (2,), (3,)]
+
+
+def test_statement_runner(conn: sqlite3.Connection):
+    runner = StatementRunner(conn, arraysize=2)
+    runner.executemany(
+        "INSERT INTO hero (id, name) VALUES ({{ id }}, {{ name }})",
+        [{"id": i, "name": f"hero-{i}"} for i in range(5)],
+    )
+
+    query = "SELECT id FROM hero WHERE id >= {{ id }} ORDER BY id"
+    rows = runner.fetch_iter(query, id=0)
+    assert next(rows) == (0,)
+    # a cursor in use is not shared
+    assert list(runner.fetch_iter(query, id=3)) == [(3,), (4,)]
+    assert list(rows) == [(1,), (2,), (3,), (4,)]
+
+    for _ in range(3):
+        assert runner.execute(query, id=4).fetchall() == [(4,)]
+
+    assert runner.cache_info().hits >= 3
+
+
+def test_get_runner(conn: sqlite3.Connection):
+    runner = get_runner(conn)
+    assert get_runner(conn) is runner
+
+    # the module-level helpers reuse statements of the runner while it is referenced
+    for i in range(3):
+        assert execute(conn, "SELECT {{ i }}", i=i).fetchall() == [(i,)]
+        assert list(fetch_iter(conn, "SELECT {{ i }}", i=i)) == [(i,)]
+
+    assert runner.cache_info().hits == 5
+
+
+class WeakConnection(sqlite3.Connection):
+    pass
+
+
+@pytest.mark.parametrize("factory", [sqlite3.Connection, WeakConnection])
+def test_get_runner_does_not_keep_connections(factory: type[sqlite3.Connection]):
+    for _ in range(5):
+        conn = sqlite3.connect(":memory:", factory=factory)
+        execute(conn, "SELECT {{ i }}", i=1)
+        conn.close()
+        del conn
+
+    gc.collect()
+    assert not [obj for obj in gc.get_objects() if isinstance(obj, StatementRunner)]
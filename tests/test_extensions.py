@@ -0,0 +1,72 @@
+from datetime import date
+from textwrap import dedent
+from typing import get_args
+
+import pytest
+from jinja2 import DictLoader, Environment
+
+from miniset import JinjaTemplateProcessor, ParamStyleType
+from miniset.types import RewriteModeType
+
+CONTEXT = {
+    "request": {"project_id": 123, "days": ["mon", "tue"], "start_date": date.today()},
+    "session": {"user_id": "sripathi"},
+    "columns": "project, hours",
+    "table": "timesheet",
+}
+
+TEMPLATES = [
+    "SELECT * FROM t WHERE project_id = {{ request.project_id }} AND user_id = {{ session['user_id'] }}",
+    "SELECT * FROM t WHERE user_id LIKE {{ '%' ~ session.user_id ~ '%' }}",
+    "SELECT * FROM t WHERE project_id = {{ request.project_id + 1 }}",
+    "SELECT * FROM t WHERE day IN {{ request.days | where_in }}",
+    "SELECT * FROM t WHERE day IN {{ request.days | where_in(mode='pad') }}",
+    "SELECT {{ columns | sql_safe }} FROM {{ table | identifier }}",
+    "SELECT * FROM t WHERE user_id = {{ session.user_id | upper }}",
+    "{% for day in request.days %}SELECT {{ day }}{% if not loop.last %} UNION ALL {% endif %}{% endfor %}",
+    "{% set columns -%} project, hours {%- endset %}SELECT {{ columns | sql_safe }} FROM t WHERE id = {{ request.project_id }}",
+    dedent(
+        """{% macro week(value) -%} some_sql_function({{value}}) {%- endmacro %}
+        SELECT * FROM t WHERE created_date > {{ week(request.start_date) }}"""
+    ),
+    "{% import 'utils.sql' as utils %}SELECT * FROM t {{ utils.where(request.project_id) }}",
+    "SELECT * FROM t {% include 'where.sql' %}",
+    "SELECT * FROM t WHERE active = {{ not request.archived }}",
+    "SELECT * FROM t WHERE project_id = {{ (request.project_id) }}",
+    "SELECT * FROM t WHERE project_id = {{ -request.project_id }} OR id = {{ (request.project_id + 1) * 2 }}",
+    "SELECT {{ none }}, {{ 1 }}, {{ 'a' ~ request.project_id }}, {{ (request.days | where_in) }}",
+    "{% macro week() %}{{ caller(request.project_id) }}{% endmacro %}{% call(x) week() %}{{ (x) }}{% endcall %}",
+]
+
+
+def build_processor(
+    param_style: ParamStyleType, rewrite_mode: RewriteModeType
+) -> JinjaTemplateProcessor:
+    loader = DictLoader(
+        {
+            "utils.sql": "{% macro where(value) -%} WHERE id = {{ value }} {%- endmacro %}",
+            "where.sql": "WHERE id = {{ request.project_id }}",
+        }
+    )
+    return JinjaTemplateProcessor(
+        param_style=param_style,
+        env=Environment(loader=loader),
+        rewrite_mode=rewrite_mode,
+    )
+
+
+@pytest.mark.parametrize("param_style", get_args(ParamStyleType))
+@pytest.mark.parametrize("template", TEMPLATES)
+def test_ast_rewrite(template: str, param_style: ParamStyleType):
+    stream = build_processor(param_style, "stream")
+    ast = build_processor(param_style, "ast")
+    assert ast.prepare_query(template, **CONTEXT) == stream.prepare_query(
+        template, **CONTEXT
+    )
+
+
+def test_ast_rewrite_with_compile():
+    p = build_processor("named", "ast")
+    plan = p.compile(TEMPLATES[0])
+    assert plan.is_static
+    assert plan.prepare_query(**CONTEXT) == p.prepare_query(TEMPLATES[0], **CONTEXT)
@@ -0,0 +1,82 @@
+import subprocess
+import sys
+
+import pytest
+
+# generous enough not to be flaky on slow machines while catching regressions like
+# importing importlib.metadata or asyncio at import time
+IMPORT_TIME_BUDGET_US = 500_000
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args], capture_output=True, text=True, check=True
+    )
+
+
+def parse_import_times(stderr: str) -> dict[str, int]:
+    # e.g. "import time:       604 |        604 |   miniset.types"
+    times: dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+
+    return times
+
+
+@pytest.mark.parametrize(
+    "statement,lazy_modules",
+    [
+        (
+            "import miniset",
+            ["miniset.jinja_context", "jinja2", "importlib.metadata", "asyncio"],
+        ),
+        (
+            "from miniset import JinjaTemplateProcessor",
+            ["importlib.metadata", "asyncio"],
+        ),
+    ],
+)
+def test_lazy_imports(statement: str, lazy_modules: list[str]):
+    result = run_python(
+        "-c", f"import sys; {statement}; print(' '.join(sorted(sys.modules)))"
+    )
+    imported = set(result.stdout.split())
+    assert imported.isdisjoint(lazy_modules)
+
+
+def test_import_time_budget():
+    result = run_python("-X", "importtime", "-c", "import miniset")
+    times = parse_import_times(result.stderr)
+    assert times["miniset"] < IMPORT_TIME_BUDGET_US
+
+
+def test_lazy_attributes():
+    import miniset
+
+    assert isinstance(miniset.__version__, str)
+    assert miniset.JinjaTemplateProcessor is not None
+    assert "JinjaTemplateProcessor" in dir(miniset)
+
+    with pytest.raises(AttributeError):
+        miniset.missing  # noqa: B018
+
+
+def test_star_import():
+    result = run_python(
+        "-c",
+        "from miniset import *; print(JinjaTemplateProcessor.__name__, __version__)",
+    )
+    assert result.stdout.startswith("JinjaTemplateProcessor ")
+
+
+def test_lazy_submodules():
+    import miniset
+
+    assert (
+        miniset.jinja_context.JinjaTemplateProcessor is miniset.JinjaTemplateProcessor
+    )
+    assert miniset.execute.StatementRunner is not None
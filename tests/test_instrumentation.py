@@ -0,0 +1,156 @@
+import asyncio
+import gc
+
+import pytest
+from jinja2 import DictLoader
+
+from miniset import JinjaTemplateProcessor
+from miniset.instrumentation import (
+    RenderEvent,
+    RenderStats,
+    fingerprint,
+    normalize_query,
+)
+
+TEMPLATE = "SELECT * FROM t WHERE name = {{ name }} AND id IN {{ ids | where_in }}"
+
+
+def test_on_render():
+    events: list[RenderEvent] = []
+    p = JinjaTemplateProcessor(on_render=events.append)
+
+    query, _ = p.prepare_query(TEMPLATE, name="foo", ids=[1, 2, 3])
+    asyncio.run(p.prepare_query_async(TEMPLATE, name="foo", ids=[1, 2]))
+    p.compile("SELECT {{ id }}").prepare_query(id=1)
+
+    assert len(events) == 3
+    assert [event.fingerprint for event in events] == [
+        fingerprint(TEMPLATE),
+        fingerprint(TEMPLATE),
+        fingerprint("SELECT {{ id }}"),
+    ]
+    assert events[0].bind_count == 4
+    assert events[0].where_in_sizes == (3,)
+    assert events[0].sql_length == len(query)
+    assert events[0].render_time > 0
+    assert events[1].where_in_sizes == (2,)
+    assert events[2].bind_count == 1
+
+
+def test_fingerprints_are_lazy():
+    p = JinjaTemplateProcessor(cache_size=1)
+    p.prepare_query(TEMPLATE, name="foo", ids=[1])
+    # not computed without on_render
+    assert len(p._fingerprints) == 0
+
+    # sources are not kept after their templates are evicted
+    p.prepare_query("SELECT 1")
+    gc.collect()
+    assert list(p._sources.values()) == ["SELECT 1"]
+
+
+def test_render_stats():
+    stats = RenderStats()
+    p = JinjaTemplateProcessor(on_render=stats)
+
+    for i in range(1, 4):
+        p.prepare_query(TEMPLATE, name="foo", ids=list(range(i)))
+
+    snapshot = stats.snapshot()
+    assert snapshot[fingerprint(TEMPLATE)]["count"] == 3
+    assert snapshot[fingerprint(TEMPLATE)]["max_bind_count"] == 4
+    assert snapshot[fingerprint(TEMPLATE)]["max_where_in_size"] == 3
+
+    stats.clear()
+    assert stats.snapshot() == {}
+
+
+def test_prepare_query_with_fingerprint():
+    p = JinjaTemplateProcessor(param_style="named")
+
+    first = p.prepare_query_with_fingerprint(TEMPLATE, name="foo", ids=[1, 2, 3])
+    assert (first.query, first.bind_params) == p.prepare_query(
+        TEMPLATE, name="foo", ids=[1, 2, 3]
+    )
+    assert first.normalized == "SELECT * FROM t WHERE name = :name_1 AND id IN (...)"
+
+    # the same shape
+    second = p.prepare_query_with_fingerprint(TEMPLATE, name="bar", ids=[4, 5, 6])
+    assert second.fingerprint == first.fingerprint
+    assert second.normalized is first.normalized
+
+    # a different shape
+    third = p.prepare_query_with_fingerprint(TEMPLATE, name="foo", ids=[1])
+    assert third.fingerprint != first.fingerprint
+    assert third.normalized == first.normalized
+
+
+def test_prepare_query_with_fingerprint_static():
+    p = JinjaTemplateProcessor()
+    template = "SELECT * FROM t\nWHERE id = {{ id }}"
+
+    result = p.prepare_query_with_fingerprint(template, id=1)
+    assert result == (
+        "SELECT * FROM t\nWHERE id = %s",
+        [1],
+        fingerprint(template),
+        "SELECT * FROM t WHERE id = %s",
+    )
+    # undefined values fall back to full rendering in the same shape
+    assert p.prepare_query_with_fingerprint(template).fingerprint == fingerprint(
+        template
+    )
+
+    # a template object
+    other = p.prepare_query_with_fingerprint(p._env.from_string(template), id=1)
+    assert other.query == result.query
+    assert other.fingerprint != result.fingerprint
+
+
+def test_prepare_query_with_fingerprint_reloaded():
+    loader = DictLoader({"q.sql": "SELECT a FROM t WHERE id = {{ id }}"})
+    p = JinjaTemplateProcessor(loader=loader)
+
+    first = p.prepare_query_with_fingerprint("q.sql", id=1)
+    assert first.normalized == "SELECT a FROM t WHERE id = %s"
+
+    loader.mapping["q.sql"] = "SELECT b, c FROM other WHERE id = {{ id }}"
+    second = p.prepare_query_with_fingerprint("q.sql", id=1)
+    assert second.fingerprint != first.fingerprint
+    assert second.normalized == "SELECT b, c FROM other WHERE id = %s"
+
+
+def test_prepare_query_with_fingerprint_evicted():
+    p = JinjaTemplateProcessor(cache_size=2)
+    for i in range(10):
+        p.prepare_query_with_fingerprint(f"SELECT {i}, {{{{ a }}}}", a=1)
+
+    # plans do not keep evicted templates alive
+    gc.collect()
+    assert len(p._sources) == 2
+
+
+@pytest.mark.parametrize(
+    "query,expected",
+    [
+        (
+            "SELECT *\n  FROM t WHERE id IN (?,?, ?)",
+            "SELECT * FROM t WHERE id IN (...)",
+        ),
+        ("SELECT * FROM t WHERE id IN (%s)", "SELECT * FROM t WHERE id IN (...)"),
+        ("SELECT * FROM t WHERE id IN (:1,:2)", "SELECT * FROM t WHERE id IN (...)"),
+        ("SELECT * FROM t WHERE id IN ($1,$2)", "SELECT * FROM t WHERE id IN (...)"),
+        (
+            "SELECT * FROM t WHERE id IN (:where_in_1,:where_in_2)",
+            "SELECT * FROM t WHERE id IN (...)",
+        ),
+        (
+            "SELECT * FROM t WHERE id IN (%(where_in_1)s,%(where_in_2)s)",
+            "SELECT * FROM t WHERE id IN (...)",
+        ),
+        ("SELECT * FROM t WHERE id = ANY($1)", "SELECT * FROM t WHERE id = ANY(...)"),
+        ("SELECT * FROM t WHERE id IN (1, 2)", "SELECT * FROM t WHERE id IN (1, 2)"),
+    ],
+)
+def test_normalize_query(query: str, expected: str):
+    assert normalize_query(query) == expected
@@ -1,11 +1,15 @@
+import sqlite3
+from array import array
 from datetime import date
 from textwrap import dedent
-from typing import Any, Union
+from typing import Any, Union, get_args
 
 import pytest
 from jinja2 import DictLoader, Environment
 
 from miniset import JinjaTemplateProcessor, ParamStyleType
+from miniset.exceptions import MinisetTemplateException
+from miniset.types import RewriteModeType, WhereInModeType
 
 _DATA = {
     "etc": {
@@ -288,3 +292,292 @@ def test_prepare_query(
     query, params = p.prepare_query(template, **_DATA)
     assert query == expected_query
     assert params == expected_params
+
+
+def test_template_cache():
+    p = JinjaTemplateProcessor(cache_size=1)
+
+    for _ in range(3):
+        query, bind_params = p.prepare_query(WHERE_IN_TEMPLATE, **_DATA)
+        assert query == "select * from timesheet where day in (%s,%s,%s,%s,%s)"
+        assert bind_params == ["mon", "tue", "wed", "thu", "fri"]
+
+    info = p.cache_info()
+    assert info.hits == 2
+    assert info.misses == 1
+
+    p.prepare_query("select 1", **_DATA)
+    assert p.cache_info().evictions == 1
+
+    p.clear_cache()
+    assert p.cache_info().size == 0
+
+
+@pytest.mark.parametrize(
+    "where_in_mode,param_style,expected_count",
+    [
+        ("expand", "format", 100),
+        ("pad", "format", 8),
+        ("pad", "named", 8),
+        ("array", "asyncpg", 1),
+        ("array", "numeric", 1),
+    ],
+)
+def test_where_in_mode(
+    where_in_mode: WhereInModeType,
+    param_style: ParamStyleType,
+    expected_count: int,
+):
+    p = JinjaTemplateProcessor(param_style=param_style, where_in_mode=where_in_mode)
+    queries = {
+        p.prepare_query(
+            "select * from t where id {{ ids | where_in }}", ids=list(range(n))
+        )[0]
+        for n in range(1, 101)
+    }
+    assert len(queries) == expected_count
+
+
+@pytest.mark.parametrize(
+    "template,param_style,expected_query,expected_params",
+    [
+        (
+            "select * from t where id in {{ ids | where_in(mode='pad') }}",
+            "qmark",
+            "select * from t where id in (?,?,?,?)",
+            [1, 2, 3, 3],
+        ),
+        (
+            "select * from t where id {{ ids | where_in(mode='array') }}",
+            "asyncpg",
+            "select * from t where id = ANY($1)",
+            [[1, 2, 3]],
+        ),
+    ],
+)
+def test_where_in_filter_mode(
+    template: str,
+    param_style: ParamStyleType,
+    expected_query: str,
+    expected_params: Union[list[Any], dict[Any, Any]],
+):
+    p = JinjaTemplateProcessor(param_style=param_style)
+    query, params = p.prepare_query(template, ids=[1, 2, 3])
+    assert query == expected_query
+    assert params == expected_params
+
+
+def test_where_in_array_mode_with_unsupported_param_style():
+    p = JinjaTemplateProcessor(param_style="qmark", where_in_mode="array")
+    with pytest.raises(MinisetTemplateException):
+        p.prepare_query("select * from t where id {{ ids | where_in }}", ids=[1])
+
+
+@pytest.mark.parametrize(
+    "ids",
+    [
+        (1, 2, 3),
+        {1, 2, 3},
+        frozenset((1, 2, 3)),
+        range(1, 4),
+        array("i", [1, 2, 3]),
+    ],
+)
+@pytest.mark.parametrize("param_style", get_args(ParamStyleType))
+def test_where_in_with_iterables(ids: Any, param_style: ParamStyleType):
+    p = JinjaTemplateProcessor(param_style=param_style)
+    expected = p.prepare_query(WHERE_IN_TEMPLATE, request={"days": [1, 2, 3]})
+    assert p.prepare_query(WHERE_IN_TEMPLATE, request={"days": ids}) == expected
+
+
+def test_where_in_with_numpy_array():
+    np = pytest.importorskip("numpy")
+
+    p = JinjaTemplateProcessor()
+    _, bind_params = p.prepare_query(
+        "select * from t where id in {{ ids | where_in }}", ids=np.arange(3)
+    )
+    assert bind_params == [0, 1, 2]
+    assert all(type(v) is int for v in bind_params)
+
+
+DEDUPE_TEMPLATE = """
+select * from a where tenant_id = {{ tenant_id }} and name = {{ request.name }}
+union all
+select * from b where tenant_id = {{ tenant_id }} and name = {{ request.other }}
+""".strip()
+
+
+@pytest.mark.parametrize(
+    "param_style,expected_query,expected_params",
+    [
+        (
+            "named",
+            DEDUPE_TEMPLATE.replace("{{ tenant_id }}", ":tenant_id_1")
+            .replace("{{ request.name }}", ":request_2")
+            .replace("{{ request.other }}", ":request_3"),
+            {"tenant_id_1": 1, "request_2": "foo", "request_3": "bar"},
+        ),
+        (
+            "pyformat",
+            DEDUPE_TEMPLATE.replace("{{ tenant_id }}", "%(tenant_id_1)s")
+            .replace("{{ request.name }}", "%(request_2)s")
+            .replace("{{ request.other }}", "%(request_3)s"),
+            {"tenant_id_1": 1, "request_2": "foo", "request_3": "bar"},
+        ),
+        (
+            "numeric",
+            DEDUPE_TEMPLATE.replace("{{ tenant_id }}", ":1")
+            .replace("{{ request.name }}", ":2")
+            .replace("{{ request.other }}", ":3"),
+            [1, "foo", "bar"],
+        ),
+        (
+            "asyncpg",
+            DEDUPE_TEMPLATE.replace("{{ tenant_id }}", "$1")
+            .replace("{{ request.name }}", "$2")
+            .replace("{{ request.other }}", "$3"),
+            [1, "foo", "bar"],
+        ),
+        (
+            "qmark",
+            DEDUPE_TEMPLATE.replace("{{ tenant_id }}", "?")
+            .replace("{{ request.name }}", "?")
+            .replace("{{ request.other }}", "?"),
+            [1, "foo", 1, "bar"],
+        ),
+    ],
+)
+def test_dedupe_params(
+    param_style: ParamStyleType,
+    expected_query: str,
+    expected_params: Union[list[Any], dict[Any, Any]],
+):
+    p = JinjaTemplateProcessor(param_style=param_style, dedupe_params=True)
+    context = {"tenant_id": 1, "request": {"name": "foo", "other": "bar"}}
+
+    assert p.prepare_query(DEDUPE_TEMPLATE, **context) == (
+        expected_query,
+        expected_params,
+    )
+    # the same as what a query plan does
+    plan = p.compile(DEDUPE_TEMPLATE)
+    assert plan.is_static
+    assert plan.prepare_query(**context) == (expected_query, expected_params)
+
+
+@pytest.mark.parametrize("rewrite_mode", get_args(RewriteModeType))
+def test_dedupe_params_by_lookup(rewrite_mode: RewriteModeType):
+    p = JinjaTemplateProcessor(
+        param_style="numeric", dedupe_params=True, rewrite_mode=rewrite_mode
+    )
+    template = "select {{ a.x }}, {{ a.y }}, {{ a.x }}"
+
+    # different lookups are bound separately even if they share a value object,
+    # so the query does not depend on the values
+    for a in ({"x": None, "y": None}, {"x": 1, "y": 2}):
+        expected = ("select :1, :2, :1", [a["x"], a["y"]])
+        assert p.prepare_query(template, a=a) == expected
+        assert p.compile(template).prepare_query(a=a) == expected
+
+
+def test_dedupe_params_assigned_variables():
+    p = JinjaTemplateProcessor(
+        param_style="numeric",
+        dedupe_params=True,
+        loader=DictLoader({"x.sql": "{{ x }} = {{ x }}"}),
+    )
+
+    # loop variables are bound at every iteration
+    assert p.prepare_query(
+        "{% for x in xs %}{{ x }} {{ y }} {% endfor %}", xs=[1, 1], y=2
+    ) == (":1 :2 :3 :2 ", [1, 2, 1])
+    # each include has its own scope
+    assert p.prepare_query(
+        "{% for x in xs %}{% include 'x.sql' %} {% endfor %}", xs=[1, 2]
+    ) == (":1 = :1 :2 = :2 ", [1, 2])
+
+
+def test_result_cache():
+    p = JinjaTemplateProcessor(param_style="qmark", result_cache_size=2)
+    template = "select * from t where a = {{ a }} and b in {{ b | where_in }}"
+
+    first = p.prepare_query(template, a=1, b=[1, 2])
+    assert first == ("select * from t where a = ? and b in (?,?)", [1, 1, 2])
+    assert p.prepare_query(template, b=[1, 2], a=1) == first
+
+    # values of different types are not mixed up
+    assert p.prepare_query(template, a=True, b=[1, 2])[1] == [True, 1, 2]
+    assert p.prepare_query(template, a=1.0, b=(1, 2))[1] == [1.0, 1, 2]
+
+    info = p.result_cache_info()
+    assert (info.hits, info.misses, info.evictions) == (1, 3, 1)
+
+    p.clear_result_cache()
+    assert p.result_cache_info().size == 0
+
+
+def test_result_cache_named():
+    p = JinjaTemplateProcessor(param_style="named", result_cache_size=2)
+    _, params = p.prepare_query("select {{ a }}", a=1)
+    assert params == {"a_1": 1}
+
+    # changing returned bind params does not change the cached ones
+    params["a_1"] = 2
+    assert p.prepare_query("select {{ a }}", a=1) == ("select :a_1", {"a_1": 1})
+    assert p.result_cache_info().hits == 1
+
+
+@pytest.mark.parametrize("param_style", ["qmark", "named"])
+def test_result_cache_with_db(param_style: ParamStyleType):
+    p = JinjaTemplateProcessor(param_style=param_style, result_cache_size=2)
+    conn = sqlite3.connect(":memory:")
+
+    for _ in range(2):
+        query, params = p.prepare_query("SELECT {{ a }}, {{ b }}", a=1, b="x")
+        assert conn.execute(query, params).fetchall() == [(1, "x")]
+
+    conn.close()
+
+
+def test_result_cache_unhashable():
+    p = JinjaTemplateProcessor(result_cache_size=2)
+    ids = array("i", [1, 2])
+
+    assert p.prepare_query("select {{ ids | where_in }}", ids=ids) == (
+        "select (%s,%s)",
+        [1, 2],
+    )
+    assert p.result_cache_info().size == 0
+
+
+def test_result_cache_without_template_cache():
+    p = JinjaTemplateProcessor(cache_size=0, result_cache_size=2)
+    for _ in range(3):
+        assert p.prepare_query("select {{ a }}", a=1) == ("select %s", [1])
+
+    info = p.result_cache_info()
+    assert (info.hits, info.misses, info.size) == (2, 1, 1)
+
+
+def test_result_cache_mutable_params():
+    p = JinjaTemplateProcessor(param_style="asyncpg", result_cache_size=2)
+    template = "select * from t where id {{ ids | where_in(mode='array') }}"
+
+    _, params = p.prepare_query(template, ids=[1, 2])
+    params[0].append(99)
+    # nested values are not shared with the cached entry
+    assert p.prepare_query(template, ids=[1, 2]) == (
+        "select * from t where id = ANY($1)",
+        [[1, 2]],
+    )
+    assert p.result_cache_info().hits == 1
+
+
+def test_result_cache_reloaded_template():
+    loader = DictLoader({"q.sql": "select {{ a }}"})
+    p = JinjaTemplateProcessor(loader=loader, result_cache_size=2)
+    assert p.prepare_query("q.sql", a=1) == ("select %s", [1])
+
+    loader.mapping["q.sql"] = "select {{ a }}, 2"
+    assert p.prepare_query("q.sql", a=1) == ("select %s, 2", [1])
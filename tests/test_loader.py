@@ -0,0 +1,101 @@
+import asyncio
+import os
+from pathlib import Path
+
+import pytest
+from jinja2 import Environment, FileSystemLoader, TemplateNotFound
+
+from miniset import JinjaTemplateProcessor
+
+
+@pytest.fixture
+def template_dir(tmp_path: Path) -> Path:
+    (tmp_path / "reports").mkdir()
+    (tmp_path / "macros").mkdir()
+
+    (tmp_path / "macros" / "utils.sql").write_text(
+        "{% macro where_project(id) -%} WHERE project_id = {{ id }} {%- endmacro %}"
+    )
+    (tmp_path / "reports" / "daily.sql").write_text(
+        "{% import 'macros/utils.sql' as utils %}SELECT * FROM daily {{ utils.where_project(project_id) }}"
+    )
+    (tmp_path / "reports" / "weekly.sql").write_text(
+        "SELECT * FROM weekly {% include 'where.sql' %}"
+    )
+    (tmp_path / "where.sql").write_text("WHERE project_id = {{ project_id }}")
+
+    return tmp_path
+
+
+def test_named_templates(template_dir: Path):
+    p = JinjaTemplateProcessor(loader=FileSystemLoader(template_dir))
+
+    assert p.prepare_query("reports/daily.sql", project_id=1) == (
+        "SELECT * FROM daily WHERE project_id = %s",
+        [1],
+    )
+    assert p.prepare_query("reports/weekly.sql", project_id=1) == (
+        "SELECT * FROM weekly WHERE project_id = %s",
+        [1],
+    )
+    # a query string is not regarded as a template name
+    assert p.prepare_query("SELECT {{ id }}", id=1) == ("SELECT %s", [1])
+    # neither is a query without whitespace unless the loader finds it
+    assert p.prepare_query("COMMIT") == ("COMMIT", [])
+    assert asyncio.run(p.prepare_query_async("VACUUM")) == ("VACUUM", [])
+    assert p.analyze("ROLLBACK").variables == set()
+
+    # a template included by a named template is still required
+    (template_dir / "broken.sql").write_text("{% include 'missing.sql' %}")
+    with pytest.raises(TemplateNotFound):
+        p.prepare_query("broken.sql")
+
+    plan = p.compile("where.sql")
+    assert plan.is_static
+    assert plan.prepare_query(project_id=1) == ("WHERE project_id = %s", [1])
+
+
+def test_auto_reload(template_dir: Path):
+    p = JinjaTemplateProcessor(loader=FileSystemLoader(template_dir))
+    p.warmup(["reports/daily.sql"])
+
+    template = p._get_template("reports/daily.sql")
+    # not recompiled unless the source changes
+    assert p._get_template("reports/daily.sql") is template
+
+    path = template_dir / "reports" / "daily.sql"
+    path.write_text("SELECT * FROM daily_v2 WHERE id = {{ id }}")
+    mtime = os.path.getmtime(path) + 10
+    os.utime(path, (mtime, mtime))
+
+    assert p.prepare_query("reports/daily.sql", id=1) == (
+        "SELECT * FROM daily_v2 WHERE id = %s",
+        [1],
+    )
+
+
+def test_constant_expressions_in_included_templates(template_dir: Path):
+    (template_dir / "const.sql").write_text(
+        "{{ 'const' }} AND b IN {{ [1, 2] | where_in }} AND c = {{ y }}"
+    )
+    (template_dir / "outer.sql").write_text(
+        "SELECT * FROM t WHERE a = {{ x }} AND {% include 'const.sql' %}"
+    )
+    p = JinjaTemplateProcessor(
+        loader=FileSystemLoader(template_dir), param_style="numeric"
+    )
+
+    # the included template is compiled while the outer one is rendered,
+    # but its constant expressions are still bound at every render
+    expected = (
+        "SELECT * FROM t WHERE a = :1 AND :2 AND b IN (:3,:4) AND c = :5",
+        [1, "const", 1, 2, 2],
+    )
+    assert p.prepare_query("outer.sql", x=1, y=2) == expected
+    assert p.prepare_query("outer.sql", x=1, y=2) == expected
+
+
+def test_auto_reload_without_loader():
+    env = Environment(auto_reload=False)
+    JinjaTemplateProcessor(env=env)
+    assert env.auto_reload is False
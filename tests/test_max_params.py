@@ -0,0 +1,118 @@
+import sqlite3
+from collections.abc import Generator
+from typing import get_args
+
+import pytest
+
+from miniset import JinjaTemplateProcessor, ParamStyleType
+from miniset.exceptions import MinisetTemplateException
+from miniset.execute import StatementRunner
+from miniset.types import WhereInModeType
+
+MAX_PARAMS = 100
+
+QUERY = "SELECT id FROM hero WHERE name != {{ name }} AND id IN {{ ids | where_in }} ORDER BY id"
+
+
+@pytest.fixture
+def conn() -> Generator[sqlite3.Connection, None, None]:
+    conn = sqlite3.connect(":memory:")
+    if not hasattr(conn, "setlimit"):  # Python < 3.11
+        conn.close()
+        pytest.skip("sqlite3.Connection.setlimit is not available")
+
+    conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, MAX_PARAMS)
+    conn.execute("CREATE TABLE hero (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.executemany(
+        "INSERT INTO hero (id, name) VALUES (?, ?)",
+        [(i, f"hero-{i}") for i in range(1000)],
+    )
+    yield conn
+    conn.close()
+
+
+def test_max_params_exceeded():
+    p = JinjaTemplateProcessor(max_params=MAX_PARAMS)
+    p.prepare_query(QUERY, name="foo", ids=list(range(MAX_PARAMS - 1)))
+
+    with pytest.raises(MinisetTemplateException):
+        p.prepare_query(QUERY, name="foo", ids=list(range(MAX_PARAMS)))
+
+    plan = JinjaTemplateProcessor(max_params=1).compile("SELECT {{ a }}, {{ b }}")
+    assert plan.is_static
+    with pytest.raises(MinisetTemplateException):
+        plan.prepare_query(a=1, b=2)
+
+
+def test_invalid_max_params():
+    with pytest.raises(ValueError):
+        JinjaTemplateProcessor(max_params=0)
+
+
+@pytest.mark.parametrize("param_style", get_args(ParamStyleType))
+@pytest.mark.parametrize("where_in_mode", ["expand", "pad"])
+def test_prepare_query_chunks(
+    param_style: ParamStyleType, where_in_mode: WhereInModeType
+):
+    p = JinjaTemplateProcessor(
+        param_style=param_style, where_in_mode=where_in_mode, max_params=MAX_PARAMS
+    )
+    ids = list(range(1000))
+
+    chunks = p.prepare_query_chunks(
+        "SELECT id FROM hero WHERE name IN {{ names | where_in }} AND id IN {{ ids | where_in }}",
+        names=["foo", "bar"],
+        ids=set(ids),
+    )
+    assert len(chunks) > 1
+    assert all(len(params) <= MAX_PARAMS for _, params in chunks)
+
+    # the largest where_in list is split while the others are repeated in every chunk
+    values = [
+        list(params.values()) if isinstance(params, dict) else params
+        for _, params in chunks
+    ]
+    assert all(v[:2] == ["foo", "bar"] for v in values)
+    assert sorted({value for v in values for value in v[2:]}) == ids
+
+
+def test_prepare_query_chunks_within_limit():
+    p = JinjaTemplateProcessor(max_params=MAX_PARAMS)
+    assert p.prepare_query_chunks(QUERY, name="foo", ids=[1, 2]) == [
+        p.prepare_query(QUERY, name="foo", ids=[1, 2])
+    ]
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        # no where_in to split
+        " UNION ".join(f"SELECT {{{{ ids[{i}] }}}}" for i in range(MAX_PARAMS + 1)),
+        # bind params other than the where_in values exceed the limit by themselves
+        " UNION ".join(f"SELECT {{{{ ids[{i}] }}}}" for i in range(MAX_PARAMS))
+        + " UNION SELECT id FROM t WHERE id IN {{ ids | where_in }}",
+    ],
+)
+def test_prepare_query_chunks_cannot_split(query: str):
+    p = JinjaTemplateProcessor(max_params=MAX_PARAMS)
+    with pytest.raises(MinisetTemplateException):
+        p.prepare_query_chunks(query, ids=list(range(MAX_PARAMS + 1)))
+
+
+def test_sqlite(conn: sqlite3.Connection):
+    ids = list(range(0, 1000, 2))
+
+    with pytest.raises(sqlite3.OperationalError):
+        StatementRunner(conn, JinjaTemplateProcessor(param_style="qmark")).execute(
+            QUERY, name="foo", ids=ids
+        )
+
+    runner = StatementRunner(
+        conn, JinjaTemplateProcessor(param_style="qmark", max_params=MAX_PARAMS)
+    )
+    # split only if the caller opts in
+    with pytest.raises(MinisetTemplateException):
+        list(runner.fetch_iter(QUERY, name="foo", ids=ids))
+
+    rows = runner.fetch_iter(QUERY, name="foo", ids=ids, split_where_in=True)
+    assert [row[0] for row in rows] == ids
@@ -0,0 +1,41 @@
+import pytest
+
+from miniset import JinjaTemplateProcessor
+from miniset.parallel import render_parallel
+
+TEMPLATE = """
+SELECT * FROM {{ table | identifier }}
+WHERE id IN {{ ids | where_in }}{% if name %} AND name = {{ name }}{% endif %}
+"""
+
+
+def test_render_parallel():
+    contexts = [
+        {"table": f"t{i}", "ids": list(range(i % 5 + 1)), "name": i % 2 and f"n{i}"}
+        for i in range(50)
+    ]
+    p = JinjaTemplateProcessor(param_style="named", identifier_quote_character="`")
+    expected = [p.prepare_query(TEMPLATE, **context) for context in contexts]
+
+    results = render_parallel(
+        TEMPLATE,
+        iter(contexts),
+        workers=2,
+        batch_size=7,
+        max_pending=2,
+        param_style="named",
+        identifier_quote_character="`",
+    )
+    assert list(results) == expected
+
+
+def test_render_parallel_static():
+    contexts = [{"id": i} for i in range(10)]
+    assert list(
+        render_parallel("SELECT {{ id }}", contexts, workers=1, param_style="qmark")
+    ) == [("SELECT ?", [i]) for i in range(10)]
+
+
+def test_render_parallel_invalid_batch_size():
+    with pytest.raises(ValueError):
+        list(render_parallel("SELECT 1", [{}], batch_size=0))
@@ -0,0 +1,103 @@
+from typing import get_args
+
+import pytest
+from markupsafe import Markup
+
+from miniset import JinjaTemplateProcessor, ParamStyleType
+from miniset.validation import ContextValidator
+
+DATA = {
+    "request": {"project_id": 123, "days": ["mon", "tue"], "ids": {"a": 1}},
+    "session": {"user_id": "sripathi"},
+    "column": "name",
+}
+
+
+@pytest.mark.parametrize("param_style", get_args(ParamStyleType))
+@pytest.mark.parametrize(
+    "template,is_static",
+    [
+        (
+            "SELECT * FROM t WHERE project_id = {{ request.project_id }} AND user_id = {{ session['user_id'] }}",
+            True,
+        ),
+        ("SELECT * FROM t WHERE a = {{ 1 }} AND b = {{ request.ids.a }}", True),
+        ("SELECT * FROM t WHERE a = {{ missing }}", True),
+        ("SELECT * FROM t", True),
+        ("SELECT * FROM t WHERE day IN {{ request.days | where_in }}", False),
+        ("SELECT {{ column | sql_safe }} FROM t", False),
+        ("SELECT {{ column | identifier }} FROM t", False),
+        ("SELECT * FROM t {% if column %}WHERE a = {{ column }}{% endif %}", False),
+        ("SELECT * FROM t WHERE a = {{ '%' ~ column ~ '%' }}", False),
+    ],
+)
+def test_compile(template: str, is_static: bool, param_style: ParamStyleType):
+    p = JinjaTemplateProcessor(param_style=param_style)
+    plan = p.compile(template)
+    assert plan.is_static is is_static
+    assert (plan.dynamic_reason is None) is is_static
+
+    for _ in range(2):
+        assert plan.prepare_query(**DATA) == p.prepare_query(template, **DATA)
+
+
+def test_compile_with_markup_value():
+    p = JinjaTemplateProcessor(validator=ContextValidator(extra_types=[Markup]))
+    plan = p.compile("SELECT * FROM t WHERE a = {{ request.value }}")
+    assert plan.is_static
+
+    # falls back to full rendering
+    query, bind_params = plan.prepare_query(request={"value": Markup("1")})
+    assert query == "SELECT * FROM t WHERE a = 1"
+    assert bind_params == []
+
+
+def test_compile_with_set_context():
+    p = JinjaTemplateProcessor(param_style="named")
+    p.set_context(tenant_id=1)
+
+    plan = p.compile("SELECT * FROM t WHERE tenant_id = {{ tenant_id }}")
+    assert plan.prepare_query(tenant_id=2) == (
+        "SELECT * FROM t WHERE tenant_id = :tenant_id_1",
+        {"tenant_id_1": 1},
+    )
+
+
+def test_prepare_many():
+    p = JinjaTemplateProcessor(param_style="qmark")
+    rows = ({"id": i, "name": f"name-{i}"} for i in range(5))
+
+    batches = list(
+        p.prepare_many(
+            "INSERT INTO t (id, name) VALUES ({{ id }}, {{ name }})",
+            rows,
+            batch_size=2,
+        )
+    )
+    assert [query for query, _ in batches] == [
+        "INSERT INTO t (id, name) VALUES (?, ?)"
+    ] * 3
+    assert [bind_params for _, bind_params in batches] == [
+        [[0, "name-0"], [1, "name-1"]],
+        [[2, "name-2"], [3, "name-3"]],
+        [[4, "name-4"]],
+    ]
+
+
+def test_prepare_many_with_dynamic_shape():
+    p = JinjaTemplateProcessor(param_style="named")
+    rows = [{"ids": [1]}, {"ids": [2]}, {"ids": [3, 4]}]
+
+    batches = list(
+        p.prepare_many("DELETE FROM t WHERE id IN {{ ids | where_in }}", rows)
+    )
+    assert batches == [
+        (
+            "DELETE FROM t WHERE id IN (:where_in_1)",
+            [{"where_in_1": 1}, {"where_in_1": 2}],
+        ),
+        (
+            "DELETE FROM t WHERE id IN (:where_in_1,:where_in_2)",
+            [{"where_in_1": 3, "where_in_2": 4}],
+        ),
+    ]
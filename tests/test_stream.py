@@ -0,0 +1,106 @@
+import asyncio
+import io
+from typing import get_args
+
+import pytest
+
+from miniset import JinjaTemplateProcessor, ParamStyleType
+from miniset.exceptions import MinisetTemplateException
+from miniset.instrumentation import RenderStats
+
+TEMPLATE = """
+INSERT INTO t (id, name) VALUES
+{% for row in rows %}
+({{ row.id }}, {{ row.name }}){% if not loop.last %},{% endif %}
+{% endfor %}
+"""
+
+ROWS = [{"id": i, "name": f"name-{i}"} for i in range(1000)]
+
+
+@pytest.mark.parametrize("param_style", get_args(ParamStyleType))
+def test_stream_query(param_style: ParamStyleType):
+    p = JinjaTemplateProcessor(param_style=param_style)
+    expected = p.prepare_query(TEMPLATE, rows=ROWS)
+
+    stream = p.stream_query(TEMPLATE, chunk_size=1024, rows=ROWS)
+    chunks = list(stream)
+    assert len(chunks) > 1
+    assert all(len(chunk) >= 1024 for chunk in chunks[:-1])
+    assert stream.exhausted
+    assert ("".join(chunks), stream.params) == expected
+
+
+def test_stream_query_params_before_exhausted():
+    p = JinjaTemplateProcessor()
+    stream = p.stream_query(TEMPLATE, chunk_size=1024, rows=ROWS)
+    next(stream)
+
+    with pytest.raises(MinisetTemplateException):
+        _ = stream.params
+
+
+def test_stream_query_interleaved():
+    p = JinjaTemplateProcessor()
+    streams = [p.stream_query(TEMPLATE, chunk_size=1, rows=ROWS[i:]) for i in range(3)]
+    chunks: list[list[str]] = [[], [], []]
+
+    # bind params of each stream are kept apart even if the streams are interleaved
+    while not all(stream.exhausted for stream in streams):
+        for stream, collected in zip(streams, chunks):
+            collected.extend(next(stream, ""))
+
+    for i, (stream, collected) in enumerate(zip(streams, chunks)):
+        assert ("".join(collected), stream.params) == p.prepare_query(
+            TEMPLATE, rows=ROWS[i:]
+        )
+
+    # and the bind state does not leak out of the stream
+    with pytest.raises(MinisetTemplateException):
+        p._get_bind_state()
+
+
+def test_stream_query_across_tasks():
+    p = JinjaTemplateProcessor()
+    stream = p.stream_query(TEMPLATE, chunk_size=1024, rows=ROWS)
+
+    async def consume() -> str:
+        return next(stream, "")
+
+    async def main() -> str:
+        # each chunk is rendered in a different task (context)
+        chunks: list[str] = []
+        while not stream.exhausted:
+            chunks.append(await asyncio.create_task(consume()))
+
+        return "".join(chunks)
+
+    query = asyncio.run(main())
+    assert (query, stream.params) == p.prepare_query(TEMPLATE, rows=ROWS)
+
+
+def test_write_query():
+    p = JinjaTemplateProcessor(param_style="named")
+    fp = io.StringIO()
+
+    params = p.write_query(TEMPLATE, fp, chunk_size=1024, rows=ROWS)
+    assert (fp.getvalue(), params) == p.prepare_query(TEMPLATE, rows=ROWS)
+
+
+def test_stream_query_invalid_chunk_size():
+    p = JinjaTemplateProcessor()
+    with pytest.raises(ValueError):
+        p.stream_query(TEMPLATE, chunk_size=0, rows=ROWS)
+
+
+def test_stream_query_on_render():
+    stats = RenderStats()
+    p = JinjaTemplateProcessor(on_render=stats)
+
+    query, _ = p.prepare_query(TEMPLATE, rows=ROWS)
+    list(p.stream_query(TEMPLATE, chunk_size=1024, rows=ROWS))
+
+    (metrics,) = stats.snapshot().values()
+    assert metrics["count"] == 2
+    assert metrics["max_sql_length"] == len(query)
+    assert metrics["max_bind_count"] == len(ROWS) * 2
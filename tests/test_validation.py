@@ -0,0 +1,61 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import Any
+from uuid import uuid4
+
+import pytest
+from markupsafe import Markup
+
+from miniset.exceptions import MinisetTemplateException
+from miniset.validation import ContextValidator
+
+# a user class named "dict"
+FakeDict = type("dict", (dict,), {})
+
+
+@pytest.mark.parametrize(
+    "context",
+    [
+        {"a": 1, "b": "x", "c": None, "d": 1.0, "e": True},
+        {"a": [1, 2, 3], "b": (1, "x"), "c": {1, 2}, "d": range(3)},
+        {"a": {"b": {"c": [datetime.now(), Decimal("1.0"), uuid4()]}}},
+        {"a": b"x", "b": bytearray(b"x"), "c": memoryview(b"x"), "d": [b"x"]},
+    ],
+)
+def test_validate(context: Any):
+    assert ContextValidator().validate(context) == context
+
+
+@pytest.mark.parametrize(
+    "context,message",
+    [
+        ({"a": object()}, "key a: object"),
+        ({"a": Markup("1")}, "key a: Markup"),
+        ({"a": {"b": [1, object()]}}, "key a.b[1]: object"),
+        # type names are not trusted
+        ({"a": FakeDict()}, "key a: dict"),
+    ],
+)
+def test_validate_with_unsafe_value(context: Any, message: str):
+    with pytest.raises(MinisetTemplateException, match=message.replace("[", r"\[")):
+        ContextValidator().validate(context)
+
+
+def test_validate_with_limits():
+    with pytest.raises(MinisetTemplateException, match="nested too deeply"):
+        ContextValidator(max_depth=2).validate({"a": [[[1]]]})
+
+    with pytest.raises(MinisetTemplateException, match="too many values"):
+        ContextValidator(max_items=3).validate({"a": [1, 2], "b": [3, 4]})
+
+
+def test_register():
+    class Point:
+        pass
+
+    validator = ContextValidator()
+    with pytest.raises(MinisetTemplateException):
+        validator.validate({"a": [Point()]})
+
+    validator.register(Point)
+    validator.validate({"a": [Point()]})